@@ -0,0 +1,64 @@
+"""
+Gunicorn configuration for tournament project.
+
+Every setting can be overridden from the environment so the Heroku config
+vars decide the production profile:
+
+    WEB_CONCURRENCY              number of worker processes
+    GUNICORN_WORKER_CLASS        uvicorn (ASGI, serves the live leaderboard
+                                 streams) or gthread (WSGI, no streams)
+    GUNICORN_THREADS             threads per worker running Django views
+    GUNICORN_MAX_REQUESTS        recycle a worker after this many requests
+    GUNICORN_MAX_REQUESTS_JITTER random extra requests so workers do not
+                                 all recycle at the same time
+    GUNICORN_WARMUP              set to False to skip the warm-up hook
+"""
+
+import multiprocessing
+import os
+
+# worker class name: (gunicorn worker class, application). Both run several
+# requests per process, which the admission controller needs to queue and shed
+# them; sync workers would leave the overload in the listen backlog.
+WORKER_CLASSES = {
+    'uvicorn': ('uvicorn.workers.UvicornH11Worker', 'tournament.asgi:application'),
+    'gthread': ('gthread', 'tournament.wsgi:application'),
+}
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_name = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn')
+if worker_name not in WORKER_CLASSES:
+    raise ValueError('GUNICORN_WORKER_CLASS must be one of ' + ', '.join(WORKER_CLASSES))
+worker_class, wsgi_app = WORKER_CLASSES[worker_name]
+# read by the settings for the uvicorn worker's thread pool and the admission
+# queue, which gets the threads beyond ADMISSION_CAPACITY and the reserved ones
+threads = int(os.environ.setdefault('GUNICORN_THREADS', '16'))
+
+# Import Django, DRF and the URLConf once in the master so every forked
+# worker shares the already imported modules.
+preload_app = True
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+WARMUP = os.environ.get('GUNICORN_WARMUP', '') != 'False'
+
+
+def post_worker_init(worker):
+    '''
+    Warm the worker up before it starts accepting connections.
+    '''
+    if not WARMUP:
+        return
+    from tournament.warmup import warm_up
+    for name, count, seconds in warm_up():
+        worker.log.info('warm-up %s: %d in %.1fms', name, count, seconds * 1000)
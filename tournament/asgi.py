@@ -2,15 +2,52 @@
 ASGI config for tournament project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Live leaderboard streams are handled on the event loop, every other request
+goes to the Django WSGI application, run in a pool of GUNICORN_THREADS
+threads per process so the sync views and the admission controller see the
+same concurrency as under gthread workers. Django's own ASGI handler would
+run all sync code of a process in a single thread. Served by gunicorn with
+uvicorn workers, see gunicorn.conf.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
 
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from django.core.asgi import get_asgi_application
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tournament.settings')
 
-application = get_asgi_application()
+django_application = WsgiToAsgi(get_wsgi_application())
+
+from tournaments.live import STREAM_PATH, leaderboard_stream  # noqa: E402 needs settings
+
+
+async def lifespan(receive, send):
+    '''size the thread pool the WSGI application runs in'''
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            executor = ThreadPoolExecutor(settings.WORKER_THREADS)
+            asyncio.get_event_loop().set_default_executor(executor)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'http':
+        match = STREAM_PATH.match(scope['path'])
+        if match:
+            await leaderboard_stream(scope, receive, send, int(match.group('tournament_id')))
+            return
+    await django_application(scope, receive, send)
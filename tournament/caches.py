@@ -0,0 +1,47 @@
+"""
+Cache configuration for tournament project.
+
+The answer buffer of unfinished quizzes must be shared by every dyno and must
+stay off the primary database, so in production it lives in memcached, as
+provided by the MemCachier add-on. Without the add-on, in development and
+the test suite, each process keeps its own buffer in memory.
+"""
+
+ANSWER_BUFFER_TIMEOUT = 2 * 60 * 60
+
+
+def answer_buffer(environ):
+    '''
+    settings of the answer buffer cache from the environment
+    '''
+    servers = environ.get('MEMCACHIER_SERVERS')
+    if not servers:
+        return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'answers',
+                'TIMEOUT': ANSWER_BUFFER_TIMEOUT,
+                'OPTIONS': {'MAX_ENTRIES': 100000}}
+    return {
+        'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache',
+        'LOCATION': servers.split(','),
+        'TIMEOUT': ANSWER_BUFFER_TIMEOUT,
+        'OPTIONS': {
+            'binary': True,
+            'username': environ.get('MEMCACHIER_USERNAME'),
+            'password': environ.get('MEMCACHIER_PASSWORD'),
+            'behaviors': {
+                # fail fast and fall back to another server rather than
+                # holding a request thread on a dead one
+                'no_block': True,
+                'tcp_nodelay': True,
+                'tcp_keepalive': True,
+                'connect_timeout': 2000,
+                'send_timeout': 750 * 1000,
+                'receive_timeout': 750 * 1000,
+                '_poll_timeout': 2000,
+                'ketama': True,
+                'remove_failed': 1,
+                'retry_timeout': 2,
+                'dead_timeout': 30,
+            },
+        },
+    }
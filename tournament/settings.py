@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 
 import os
 
+from tournament import caches
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -47,14 +49,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tournaments.slowqueries.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'tournaments.admission.AdmissionControlMiddleware',
 
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tournaments.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'tournament.urls'
@@ -108,6 +113,24 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing runs in a bounded pool of lower priority processes so
+# sign-up and login spikes do not starve quiz requests. WORKERS = 0 hashes
+# inline in the request thread.
+# https://docs.djangoproject.com/en/3.0/topics/auth/passwords/
+
+PASSWORD_HASHERS = [
+    'tournaments.hashers.PooledPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+PASSWORD_HASHING = {
+    'WORKERS': int(os.environ.get('PASSWORD_HASHING_WORKERS', 2)),
+    'NICENESS': 10,
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -129,6 +152,110 @@ STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = 'media'
 
+# Write-behind scoring: graded results are journaled to local files and
+# applied to the database in batches instead of one save per submission.
+# Leaderboards show a score once the flush every SCORE_QUEUE_FLUSH_INTERVAL
+# seconds has applied it.
+SCORE_WRITE_BEHIND = os.environ.get('SCORE_WRITE_BEHIND', '') == 'True'
+SCORE_QUEUE_DIR = os.environ.get('SCORE_QUEUE_DIR', os.path.join(BASE_DIR, 'score_queue'))
+SCORE_QUEUE_BATCH_SIZE = 500
+SCORE_QUEUE_FLUSH_INTERVAL = 1.0
+
+# Days a closed tournament keeps its player and question rows in the hot
+# tables before advance_tournaments moves them to the archive tables.
+TOURNAMENT_ARCHIVE_AFTER_DAYS = int(os.environ.get('TOURNAMENT_ARCHIVE_AFTER_DAYS', 30))
+
+# Seconds browsers may keep a frozen leaderboard of a closed tournament before
+# revalidating it, short so an edited tournament is seen soon.
+LEADERBOARD_SNAPSHOT_MAX_AGE = 60
+
+# Publisher for live leaderboard streams (server-sent events, ASGI only). The
+# local broker only reaches streams of its own process, on PostgreSQL the
+# events go to every process, see the database settings below.
+LEADERBOARD_BROKER = 'tournaments.live.LocalBroker'
+
+# Threads running Django views in each worker, see gunicorn.conf.py.
+WORKER_THREADS = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# Admission control for quiz bursts. Every endpoint listed here needs one of
+# CAPACITY slots per process and may use at most LIMIT of them; requests wait
+# up to QUEUE_TIMEOUT seconds in a queue of QUEUE_SIZE, the lowest PRIORITY is
+# shed first with a 503 and Retry-After. Running and queued requests each hold
+# a worker thread, so the queue gets the threads left over by the capacity
+# and RESERVED_THREADS, which always stay free for the pages that are not gated.
+ADMISSION_RESERVED_THREADS = int(os.environ.get('ADMISSION_RESERVED_THREADS', 4))
+ADMISSION_CAPACITY = min(int(os.environ.get('ADMISSION_CAPACITY', 8)),
+                         max(WORKER_THREADS - ADMISSION_RESERVED_THREADS, 0))
+ADMISSION_CONTROL = {
+    'CAPACITY': ADMISSION_CAPACITY,
+    'QUEUE_SIZE': max(WORKER_THREADS - ADMISSION_CAPACITY - ADMISSION_RESERVED_THREADS, 0),
+    'RESERVED_THREADS': ADMISSION_RESERVED_THREADS,
+    'QUEUE_TIMEOUT': 2.0,
+    'RETRY_AFTER': 5,
+    'ENDPOINTS': {
+        'start_tournament': {'LIMIT': 4, 'PRIORITY': 0},
+        'quiz_questions': {'LIMIT': 4, 'PRIORITY': 0},
+        'quiz_autosave': {'LIMIT': 4, 'PRIORITY': 0},
+        'results': {'LIMIT': 8, 'PRIORITY': 10},
+        'quiz_answers': {'LIMIT': 8, 'PRIORITY': 10},
+        'quiz_submissions': {'LIMIT': 8, 'PRIORITY': 10},
+    },
+}
+
+# Answers autosaved during a quiz are buffered in the ANSWER_BUFFER_CACHE
+# cache, not the database, until the results are submitted. It is memcached
+# when MEMCACHIER_SERVERS is set, shared by every dyno, see tournament/caches.py.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'answers': caches.answer_buffer(os.environ),
+}
+ANSWER_BUFFER_CACHE = 'answers'
+
+# Sampling profiler for single requests, see tournaments/profiling.py. A
+# request is profiled when it carries a token from the profile_token endpoint
+# or is drawn by the SAMPLE_RATES fraction of its url name, e.g.
+# {'results': 0.01}. Collapsed stacks are written to DIRECTORY, which keeps
+# at most MAX_FILES profiles of at most MAX_AGE seconds.
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING', '') == 'True',
+    'DIRECTORY': os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles')),
+    'INTERVAL': 0.005,
+    'SAMPLE_RATES': {},
+    'MAX_FILES': 200,
+    'MAX_AGE': 7 * 24 * 60 * 60,
+}
+
+# Statements slower than THRESHOLD_MS are kept with their plan in a ring
+# buffer of SIZE entries per process, browsable at admin/slow-queries/. An
+# empty SLOW_QUERY_MS turns the log off.
+SLOW_QUERY_LOG = {
+    'THRESHOLD_MS': (float(os.environ.get('SLOW_QUERY_MS', 200))
+                     if os.environ.get('SLOW_QUERY_MS') != '' else None),
+    'SIZE': 100,
+    'EXPLAIN': True,
+}
+
+# Open Trivia DB client used to fill new tournaments. Each attempt waits at
+# most TIMEOUT (connect, read) seconds and failed attempts are retried RETRIES
+# times with jittered BACKOFF; after BREAKER_THRESHOLD consecutive failures
+# the api is not called for BREAKER_RESET seconds. Calls are MIN_INTERVAL
+# seconds apart, opentdb allows one per IP every 5 seconds. Questions are
+# fetched BATCH_SIZE at a time and unused ones are kept for CACHE_TTL seconds.
+TRIVIA_API = {
+    'URL': os.environ.get('TRIVIA_API_URL', 'https://opentdb.com'),
+    'TIMEOUT': (3.05, 5),
+    'RETRIES': 2,
+    'BACKOFF': 0.5,
+    'MIN_INTERVAL': 5,
+    'POOL_SIZE': 10,
+    'BATCH_SIZE': 50,
+    'CACHE_TTL': 300,
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_RESET': 30,
+}
+
 # Login/Logout redirect to player page
 
 LOGIN_REDIRECT_URL = '/player'
@@ -138,9 +265,23 @@ LOGOUT_REDIRECT_URL = '/'
 import dj_database_url
 db_from_env = dj_database_url.config(conn_max_age=500)
 DATABASES['default'].update(db_from_env)
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    # live scores reach the streams of every worker and dyno
+    LEADERBOARD_BROKER = 'tournaments.live.PostgresBroker'
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 # The absolute path to the directory where collectstatic will collect static files for deployment.
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Extra places for collectstatic to find static files.
+STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+
+# Content-hashed file names plus pre-compressed gzip/brotli copies, served by
+# WhiteNoise with immutable cache headers.
+STATICFILES_STORAGE = 'tournament.storage.FingerprintedStaticFilesStorage'
+
+# Cache lifetime for static files that are not content-hashed.
+WHITENOISE_MAX_AGE = 3600
+
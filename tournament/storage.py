@@ -0,0 +1,24 @@
+"""
+Static files storage for tournament project.
+
+collectstatic writes every asset under a content-hashed name together with
+pre-compressed gzip and brotli copies, which WhiteNoise serves with
+far-future, immutable cache headers.
+"""
+
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class FingerprintedStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    '''
+    Compressed manifest storage that falls back to the plain file name when
+    the manifest has no entry, i.e. when collectstatic has not been run
+    (local development and the test suite).
+    '''
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
@@ -15,8 +15,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
+from tournaments.admin import slow_queries
 
 urlpatterns = [
+    path('admin/slow-queries/', admin.site.admin_view(slow_queries), name='slow_queries'),
     path('admin/', admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
     path('', include('tournaments.urls')),
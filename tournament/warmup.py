@@ -0,0 +1,89 @@
+"""
+Warm-up routines for tournament project.
+
+Run once per worker before it accepts traffic so the first real requests
+after a deploy do not pay for URL resolution, template compilation and
+cache set-up. Database connections are not opened: Django keeps one per
+thread, and the warm-up runs in none of the threads that serve requests.
+Used by the gunicorn ``post_worker_init`` hook in ``gunicorn.conf.py`` and
+by the ``warmup`` management command.
+"""
+
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+
+def resolve_urls():
+    '''
+    Populate the reverse/lookup tables of every URL resolver and import
+    every view callable. Returns the number of URL patterns seen.
+    '''
+    def walk(resolver):
+        count = 0
+        resolver._populate()
+        for pattern in resolver.url_patterns:
+            if hasattr(pattern, 'url_patterns'):
+                count += walk(pattern)
+            else:
+                pattern.callback  # imports the view module
+                count += 1
+        return count
+    return walk(get_resolver())
+
+
+def compile_templates():
+    '''
+    Load every template shipped by the tournaments app through the template
+    engine, so the cached loader holds the compiled versions. Returns the
+    number of templates compiled. A template that does not compile raises,
+    so a broken deploy fails at boot instead of on the first request.
+    '''
+    template_dir = os.path.join(apps.get_app_config('tournaments').path, 'templates')
+    count = 0
+    for root, _, files in os.walk(template_dir):
+        for filename in files:
+            if not filename.endswith('.html'):
+                continue
+            name = os.path.relpath(os.path.join(root, filename), template_dir)
+            get_template(name.replace(os.sep, '/'))
+            count += 1
+    return count
+
+
+def prime_caches():
+    '''
+    Touch every configured cache backend so client connections are set up.
+    Returns the number of caches primed.
+    '''
+    from django.contrib.contenttypes.models import ContentType
+    for alias in settings.CACHES:
+        caches[alias].get('warmup')
+    # permission checks in the admin and DRF go through the content type cache
+    ContentType.objects.get_for_models(*apps.get_models())
+    return len(settings.CACHES)
+
+
+STEPS = [
+    ('urls', resolve_urls),
+    ('templates', compile_templates),
+    ('caches', prime_caches),
+]
+
+
+def warm_up():
+    '''
+    Run every warm-up step and return a list of
+    (step name, items warmed, seconds taken) tuples.
+    '''
+    timings = []
+    for name, step in STEPS:
+        start = time.perf_counter()
+        count = step()
+        timings.append((name, count, time.perf_counter() - start))
+    return timings
@@ -1,7 +1,164 @@
 '''
-Admin python file for registering the tournament models in the admin interface
+Admin python file for registering the tournament models in the admin interface.
+
+The changelists are built for large tables: big unfiltered tables are counted
+from the database statistics instead of COUNT(*), foreign keys are edited
+with raw id or autocomplete widgets instead of dropdowns listing every row,
+related rows are joined in the changelist query, and filters use indexed
+columns. Bulk actions run as set-based queries.
 '''
-from django.contrib import admin
-from .models import Tournament
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.db import connections, transaction
+from django.utils.functional import cached_property
+from . import lifecycle, slowqueries, snapshots, trivia
+from .models import Tournament, Question, TournamentPlayer, UPCOMING, CLOSED, ARCHIVED
+from .views import NUMBER_OF_QUESTIONS, TournamentCreate
+
+
+class EstimatedCountPaginator(Paginator):
+    '''
+    Paginator that takes the row count of an unfiltered changelist from the
+    planner statistics once the table is past ESTIMATE_ABOVE rows. Only
+    PostgreSQL keeps such an estimate, other databases count exactly.
+    '''
+    ESTIMATE_ABOVE = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > self.ESTIMATE_ABOVE:
+                return int(row[0])
+        return super().count
+
+
+class ScaleAwareAdmin(admin.ModelAdmin):
+    '''
+    changelist defaults for large tables
+    '''
+    paginator = EstimatedCountPaginator
+    # no second COUNT(*) of the whole table next to the filtered count
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(Tournament)
+class TournamentAdmin(ScaleAwareAdmin):
+    '''
+    tournaments, with bulk close, archive and question regeneration
+    '''
+    list_display = ('name', 'category', 'difficulty', 'start_date', 'end_date', 'status',
+                    'participant_count', 'completion_count', 'question_count')
+    readonly_fields = ('participant_count', 'completion_count', 'question_count')
+    list_filter = ('status', 'category', 'difficulty', 'start_date', 'end_date')
+    search_fields = ('name',)
+    actions = ('close_tournaments', 'archive_tournaments', 'regenerate_questions')
+
+    def save_model(self, request, obj, form, change):
+        '''
+        the dates may have changed, drop the frozen leaderboard; it is
+        published again when the tournament is read closed
+        '''
+        super().save_model(request, obj, form, change)
+        if change:
+            snapshots.remove(obj.id)
+
+    def close_tournaments(self, request, queryset):
+        '''
+        close the selected tournaments now, in one update, and publish their
+        final leaderboards. Their dates are kept, the status holds them closed.
+        '''
+        tournament_ids = list(queryset.exclude(status__in=[CLOSED, ARCHIVED]).values_list(
+            'id', flat=True))
+        Tournament.objects.filter(id__in=tournament_ids).update(status=CLOSED)
+        snapshots.publish_missing(tournament_ids)
+        self.message_user(request, f'{len(tournament_ids)} tournaments closed.')
+    close_tournaments.short_description = 'Close selected tournaments now'
+
+    def archive_tournaments(self, request, queryset):
+        '''
+        move the rows of the selected closed tournaments to the archive tables
+        '''
+        tournament_ids = list(queryset.filter(status=CLOSED).values_list('id', flat=True))
+        lifecycle.archive(tournament_ids)
+        skipped = queryset.count() - len(tournament_ids)
+        self.message_user(request, f'{len(tournament_ids)} tournaments archived'
+                          + (f', {skipped} not closed skipped.' if skipped else '.'))
+    archive_tournaments.short_description = 'Archive selected closed tournaments'
+
+    def regenerate_questions(self, request, queryset):
+        '''
+        replace the questions of the selected upcoming tournaments with new
+        ones from the trivia api, stored with one delete and one insert.
+        Tournaments that have started keep the questions their players saw.
+        '''
+        tournaments = list(queryset.filter(status=UPCOMING).only('id', 'category', 'difficulty'))
+        skipped = queryset.count() - len(tournaments)
+        new_questions, failed = [], []
+        for tournament in tournaments:
+            try:
+                results = trivia.client.questions(tournament.category, tournament.difficulty,
+                                                  NUMBER_OF_QUESTIONS)
+            except trivia.TriviaError:
+                failed.append(tournament)
+                continue
+            new_questions += TournamentCreate.build_questions(results, tournament)
+        regenerated = {question.tournament_id for question in new_questions}
+        with transaction.atomic():
+            Question.objects.filter(tournament_id__in=regenerated).delete()
+            Question.objects.bulk_create(new_questions)
+            Tournament.objects.filter(id__in=regenerated).update(
+                question_count=NUMBER_OF_QUESTIONS)
+        self.message_user(request, f'Questions regenerated for {len(regenerated)} tournaments'
+                          + (f', {skipped} not upcoming skipped.' if skipped else '.'))
+        if failed:
+            self.message_user(request, f'The trivia api failed for {len(failed)} tournaments, '
+                              'their questions are unchanged.', messages.WARNING)
+    regenerate_questions.short_description = 'Regenerate questions of selected upcoming tournaments'
+
+
+@admin.register(Question)
+class QuestionAdmin(ScaleAwareAdmin):
+    '''
+    questions, the tournament picked with an autocomplete widget
+    '''
+    list_display = ('question', 'tournament', 'correct_answer')
+    list_select_related = ('tournament',)
+    list_filter = ('tournament__category', 'tournament__difficulty')
+    autocomplete_fields = ('tournament',)
+
+
+@admin.register(TournamentPlayer)
+class TournamentPlayerAdmin(ScaleAwareAdmin):
+    '''
+    participations, players picked by id
+    '''
+    list_display = ('player', 'tournament', 'score', 'complete_date')
+    list_select_related = ('player', 'tournament')
+    list_filter = ('complete_date',)
+    raw_id_fields = ('player',)
+    autocomplete_fields = ('tournament',)
+
 
-admin.site.register(Tournament)
+def slow_queries(request):
+    '''
+    the slow-query log of the process serving the request, wrapped by
+    admin_view in tournament/urls.py
+    '''
+    if request.method == 'POST':
+        slowqueries.log.clear()
+        return redirect(request.path)
+    return TemplateResponse(request, 'admin/slow_queries.html',
+                            dict(admin.site.each_context(request),
+                                 title='Slow queries',
+                                 entries=slowqueries.log.entries(),
+                                 config=settings.SLOW_QUERY_LOG))
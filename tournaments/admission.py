@@ -0,0 +1,160 @@
+'''
+Admission control for quiz bursts.
+
+Requests to the endpoints listed in ADMISSION_CONTROL['ENDPOINTS'] must get a
+slot before their view runs. Each endpoint has its own concurrency limit and
+all of them share the process CAPACITY. Requests that find no free slot wait
+in a bounded queue, best priority first, until their deadline; when the queue
+is full the lowest priority request is shed, so result submissions, which
+carry completed work, are shed last. Shed requests get an immediate 503 with
+Retry-After instead of piling up until the worker times out.
+
+The controller is per process, so it needs processes that run several
+requests at once: the uvicorn and gthread workers of gunicorn.conf.py run
+GUNICORN_THREADS each. A sync worker would leave the overload queued in the
+listen backlog, so it is not offered.
+'''
+import heapq
+import itertools
+import threading
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+WAITING, GRANTED, SHED = 'waiting', 'granted', 'shed'
+
+# controller of the running middleware, read by the monitoring endpoint
+active_controller = None
+
+
+class Waiter:
+    '''
+    a request waiting for a slot
+    '''
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.state = WAITING
+        self.event = threading.Event()
+
+
+class AdmissionController:
+    '''
+    Per-endpoint concurrency limits under a shared capacity, with a bounded
+    priority wait queue
+    '''
+    def __init__(self, capacity, queue_size):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._running = Counter()
+        self._waiting = []
+        self._order = itertools.count()
+        self.admitted = Counter()
+        self.shed = Counter()
+
+    def _can_run(self, name, limit):
+        return sum(self._running.values()) < self.capacity and self._running[name] < limit
+
+    def _start(self, name):
+        self._running[name] += 1
+        self.admitted[name] += 1
+
+    def acquire(self, name, limit, priority, timeout):
+        '''
+        wait up to timeout seconds for a slot, returns False when shed
+        '''
+        with self._lock:
+            if self._can_run(name, limit):
+                self._start(name)
+                return True
+            if len(self._waiting) >= self.queue_size:
+                lowest = max(self._waiting, default=None)
+                if lowest is None or lowest[0] <= -priority:
+                    self.shed[name] += 1
+                    return False
+                # make room by shedding a lower priority waiter
+                self._waiting.remove(lowest)
+                heapq.heapify(self._waiting)
+                self._shed(lowest[2])
+            waiter = Waiter(name, limit)
+            heapq.heappush(self._waiting, (-priority, next(self._order), waiter))
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.state == WAITING:
+                self._waiting = [entry for entry in self._waiting if entry[2] is not waiter]
+                heapq.heapify(self._waiting)
+                self._shed(waiter)
+            return waiter.state == GRANTED
+
+    def _shed(self, waiter):
+        waiter.state = SHED
+        self.shed[waiter.name] += 1
+        waiter.event.set()
+
+    def release(self, name):
+        '''
+        free the slot of a finished request and hand it to the best waiter
+        '''
+        with self._lock:
+            self._running[name] -= 1
+            for entry in sorted(self._waiting):
+                waiter = entry[2]
+                if self._can_run(waiter.name, waiter.limit):
+                    self._waiting.remove(entry)
+                    self._start(waiter.name)
+                    waiter.state = GRANTED
+                    waiter.event.set()
+            heapq.heapify(self._waiting)
+
+    def stats(self):
+        '''
+        snapshot of the controller for monitoring
+        '''
+        with self._lock:
+            return {'capacity': self.capacity,
+                    'running': sum(self._running.values()),
+                    'queue_depth': len(self._waiting),
+                    'queue_size': self.queue_size,
+                    'admitted': dict(self.admitted),
+                    'shed': dict(self.shed)}
+
+
+class AdmissionControlMiddleware:
+    '''
+    Gate the configured endpoints through the admission controller
+    '''
+    def __init__(self, get_response):
+        global active_controller
+        config = settings.ADMISSION_CONTROL
+        if not config.get('ENDPOINTS'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.endpoints = config['ENDPOINTS']
+        self.timeout = config['QUEUE_TIMEOUT']
+        self.retry_after = config['RETRY_AFTER']
+        self.controller = AdmissionController(config['CAPACITY'], config['QUEUE_SIZE'])
+        active_controller = self.controller
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            name = getattr(request, 'admission_slot', None)
+            if name is not None:
+                self.controller.release(name)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = request.resolver_match.url_name
+        endpoint = self.endpoints.get(name)
+        if endpoint is None:
+            return None
+        if not self.controller.acquire(name, endpoint['LIMIT'], endpoint['PRIORITY'],
+                                       self.timeout):
+            response = HttpResponse('The server is busy, please retry shortly.', status=503,
+                                    content_type='text/plain')
+            response['Retry-After'] = str(self.retry_after)
+            return response
+        request.admission_slot = name
+        return None
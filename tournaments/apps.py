@@ -2,6 +2,27 @@
 Configure app name
 '''
 from django.apps import AppConfig
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_migrate
+
+SEARCH_MIGRATION = ('tournaments', '0014_search_index')
+
+
+def install_search_index(using, **kwargs):
+    '''
+    recreate the full-text index triggers a migration may have dropped, e.g.
+    by rebuilding an indexed table on SQLite. Nothing to do before the index
+    migration is applied or after it is unapplied.
+    '''
+    from . import search
+    connection = connections[using]
+    if SEARCH_MIGRATION in MigrationRecorder(connection).applied_migrations():
+        search.install(connection)
+
 
 class TournamentsConfig(AppConfig):
     name = 'tournaments'
+
+    def ready(self):
+        post_migrate.connect(install_search_index, sender=self)
@@ -0,0 +1,57 @@
+'''
+Buffer of the answers a player has given in an unfinished quiz.
+
+The quiz page autosaves every answer as soon as it is chosen. Answers are
+kept in the ANSWER_BUFFER_CACHE cache, shared by every dyno and off the
+primary database, under one key per (tournament, player, question), so
+concurrent saves of different questions cannot overwrite each other.
+Starting a quiz stores its question ids under one more key, so an autosave
+is checked against them without reading the database. The results view
+grades the buffer merged with the submitted form and clears it; abandoned
+buffers expire with the cache timeout.
+'''
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[settings.ANSWER_BUFFER_CACHE]
+
+
+def _key(tournament_id, player_id, question_id):
+    return f'answers:{tournament_id}:{player_id}:{question_id}'
+
+
+def _quiz_key(tournament_id, player_id):
+    return f'quiz:{tournament_id}:{player_id}'
+
+
+def start(tournament_id, player_id, question_ids):
+    '''open the buffer of a started quiz for its questions'''
+    _cache().set(_quiz_key(tournament_id, player_id), list(question_ids))
+
+
+def started(tournament_id, player_id):
+    '''ids of the questions of a started quiz, None when it is not open'''
+    question_ids = _cache().get(_quiz_key(tournament_id, player_id))
+    return None if question_ids is None else set(question_ids)
+
+
+def save(tournament_id, player_id, answers):
+    '''buffer answers, a mapping of question id to the chosen answer'''
+    _cache().set_many({_key(tournament_id, player_id, question_id): answer
+                       for question_id, answer in answers.items()})
+
+
+def load(tournament_id, player_id, question_ids):
+    '''the buffered answers of the questions, keyed by question id as a string'''
+    keys = {_key(tournament_id, player_id, question_id): str(question_id)
+            for question_id in question_ids}
+    return {keys[key]: answer for key, answer in _cache().get_many(keys).items()}
+
+
+def clear(tournament_id, player_id, question_ids):
+    '''drop the buffer once the answers are graded'''
+    _cache().delete_many([_key(tournament_id, player_id, question_id)
+                          for question_id in question_ids]
+                         + [_quiz_key(tournament_id, player_id)])
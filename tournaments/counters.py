@@ -0,0 +1,89 @@
+'''
+Denormalized participant, completion and question counts of tournaments.
+
+Lists and the api show the counts without a COUNT per tournament. Every code
+path that adds participants, completes a tournament or stores questions
+calls add() in the same transaction as its own write; the increments are
+F() expressions evaluated by the database, so concurrent requests never lose
+an update. reconcile() recomputes the counts from the rows and repairs any
+drift, e.g. after rows were changed by hand.
+'''
+from collections import Counter
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from .models import Tournament, TournamentPlayer, Question, ArchivedScore, ArchivedQuestionSet
+
+FIELDS = ('participant_count', 'completion_count', 'question_count')
+
+
+def add(tournament_id, participants=0, completions=0, questions=0):
+    '''
+    increment the counts of a tournament
+    '''
+    deltas = dict(zip(FIELDS, (participants, completions, questions)))
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if updates:
+        Tournament.objects.filter(id=tournament_id).update(**updates)
+
+
+def add_each(participants=(), completions=()):
+    '''
+    increment the participant and completion counts of several tournaments,
+    participants and completions map a tournament id to its increment
+    '''
+    participants, completions = Counter(participants), Counter(completions)
+    tournaments = {}
+    for tournament_id in set(participants) | set(completions):
+        tournaments.setdefault((participants[tournament_id], completions[tournament_id]),
+                               []).append(tournament_id)
+    # one update per distinct pair of increments rather than per tournament
+    for (participant_delta, completion_delta), tournament_ids in tournaments.items():
+        updates = {field: F(field) + delta for field, delta in (
+            ('participant_count', participant_delta), ('completion_count', completion_delta))
+                   if delta}
+        if updates:
+            Tournament.objects.filter(id__in=tournament_ids).update(**updates)
+
+
+def add_completions(completions):
+    '''
+    increment the completion counts of several tournaments, completions
+    maps a tournament id to its number of newly completed participations
+    '''
+    add_each(completions=completions)
+
+
+def _count(model, **filters):
+    '''subquery counting the rows of model that belong to the outer tournament'''
+    rows = model.objects.filter(tournament=OuterRef('pk'), **filters).order_by().values(
+        'tournament').annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+def reconcile():
+    '''
+    recompute every tournament's counts from its rows, hot or archived.
+    Returns the ids of the tournaments whose counts had drifted.
+    '''
+    counted = Tournament.objects.annotate(
+        participants=_count(TournamentPlayer) + _count(ArchivedScore),
+        completions=(_count(TournamentPlayer, complete_date__isnull=False)
+                     + _count(ArchivedScore, complete_date__isnull=False)),
+        questions=_count(Question))
+    archived_questions = Counter({question_set.tournament_id: len(question_set.questions)
+                                  for question_set in ArchivedQuestionSet.objects.all()})
+    drifted = []
+    for tournament in counted.filter(
+            ~Q(participant_count=F('participants')) | ~Q(completion_count=F('completions'))
+            | ~Q(question_count=F('questions')) | Q(id__in=list(archived_questions))):
+        questions = tournament.questions + archived_questions[tournament.id]
+        if (tournament.participant_count, tournament.completion_count,
+                tournament.question_count) == (tournament.participants,
+                                               tournament.completions, questions):
+            continue
+        Tournament.objects.filter(id=tournament.id).update(
+            participant_count=tournament.participants,
+            completion_count=tournament.completions,
+            question_count=questions)
+        drifted.append(tournament.id)
+    return drifted
@@ -0,0 +1,89 @@
+'''
+Password hashing in a bounded process pool.
+
+PBKDF2 pins a CPU for hundreds of milliseconds per password, so sign-up and
+login spikes used to starve quiz requests running in the same worker. The
+key derivation now runs in a small pool of lower priority processes, so at
+most PASSWORD_HASHING['WORKERS'] hashes run at once and the callers wait in
+their request threads. A pool whose process died is replaced. The hasher
+keeps Django's algorithm name and hash format, so existing password hashes
+are unaffected.
+'''
+import base64
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password
+
+
+class HashingPool:
+    '''
+    Process pool for key derivation, created lazily in every process
+    '''
+    def __init__(self, workers, niceness):
+        self.workers = workers
+        self.niceness = niceness
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def executor(self):
+        '''the pool of the current process, a forked worker gets its own'''
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # spawn, forking a threaded server process is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=os.nice, initargs=(self.niceness,))
+                self._pid = os.getpid()
+            return self._executor
+
+    def discard(self, executor):
+        '''drop a broken pool, the next call starts a new one'''
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def pbkdf2(self, digest_name, password, salt, iterations):
+        '''derive the key in the pool, inline when the pool is disabled'''
+        if not self.workers:
+            return hashlib.pbkdf2_hmac(digest_name, password, salt, iterations)
+        for attempt in range(2):
+            executor = self.executor()
+            try:
+                return executor.submit(
+                    hashlib.pbkdf2_hmac, digest_name, password, salt, iterations).result()
+            except BrokenProcessPool:
+                # a pool process was killed, e.g. by the OOM killer; every
+                # later call would fail, so replace the pool and retry once
+                self.discard(executor)
+                if attempt:
+                    raise
+
+
+pool = HashingPool(settings.PASSWORD_HASHING['WORKERS'],
+                   settings.PASSWORD_HASHING['NICENESS'])
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    '''
+    Django's PBKDF2-SHA256 hasher with the key derivation run in the pool
+    '''
+    def encode(self, password, salt, iterations=None):
+        assert password is not None
+        assert salt and '$' not in salt
+        iterations = iterations or self.iterations
+        hash = pool.pbkdf2(self.digest().name, password.encode(), salt.encode(), iterations)
+        hash = base64.b64encode(hash).decode('ascii').strip()
+        return "%s$%d$%s$%s" % (self.algorithm, iterations, salt, hash)
+
+
+# for async views, the calling thread only waits for the pool
+acheck_password = sync_to_async(check_password, thread_sensitive=False)
@@ -0,0 +1,91 @@
+'''
+Tournament lifecycle: moves tournaments through upcoming -> ongoing -> closed
+at their date boundaries and archives closed tournaments once the retention
+window has passed. Archiving moves the TournamentPlayer and Question rows to
+the compact ArchivedScore and ArchivedQuestionSet tables, so the hot tables
+and their indexes only hold active tournaments.
+'''
+import datetime
+from django.conf import settings
+from django.db import transaction
+from .models import (Tournament, TournamentPlayer, Question, ArchivedScore, ArchivedQuestionSet,
+                     UPCOMING, ONGOING, CLOSED, ARCHIVED)
+
+QUESTION_FIELDS = ['id', 'question', 'correct_answer', 'choices1', 'choices2', 'choices3', 'choices4']
+
+
+def advance(today=None):
+    '''
+    Update the status of the tournaments that crossed a date boundary.
+    Returns the ids of the tournaments that were just closed.
+    '''
+    today = today or datetime.date.today()
+    with transaction.atomic():
+        closed = list(Tournament.objects.filter(status__in=[UPCOMING, ONGOING],
+                                                end_date__lt=today).values_list('id', flat=True))
+        Tournament.objects.filter(id__in=closed).update(status=CLOSED)
+        Tournament.objects.filter(status=UPCOMING, start_date__lte=today).update(status=ONGOING)
+    return closed
+
+
+def archivable(today=None, retention_days=None):
+    '''
+    Ids of the closed tournaments whose retention window has passed
+    '''
+    today = today or datetime.date.today()
+    if retention_days is None:
+        retention_days = settings.TOURNAMENT_ARCHIVE_AFTER_DAYS
+    cutoff = today - datetime.timedelta(days=retention_days)
+    return list(Tournament.objects.filter(status=CLOSED, end_date__lt=cutoff)
+                .values_list('id', flat=True))
+
+
+def archive(tournament_ids):
+    '''
+    Move the participation and question rows of closed tournaments to the
+    archive tables, in the same few queries for any number of tournaments
+    '''
+    question_sets = {tournament_id: [] for tournament_id in tournament_ids}
+    with transaction.atomic():
+        ArchivedScore.objects.bulk_create(
+            ArchivedScore(tournament_id=tournament_id, player_id=player_id,
+                          score=score, complete_date=complete_date)
+            for tournament_id, player_id, score, complete_date in TournamentPlayer.objects.filter(
+                tournament_id__in=tournament_ids).values_list(
+                    'tournament_id', 'player_id', 'score', 'complete_date'))
+        for question in Question.objects.filter(tournament_id__in=tournament_ids).order_by(
+                'tournament_id', 'id').values('tournament_id', *QUESTION_FIELDS):
+            question_sets[question.pop('tournament_id')].append(question)
+        ArchivedQuestionSet.objects.filter(tournament_id__in=tournament_ids).delete()
+        ArchivedQuestionSet.objects.bulk_create(
+            ArchivedQuestionSet(tournament_id=tournament_id, questions=questions)
+            for tournament_id, questions in question_sets.items())
+        TournamentPlayer.objects.filter(tournament_id__in=tournament_ids).delete()
+        Question.objects.filter(tournament_id__in=tournament_ids).delete()
+        Tournament.objects.filter(id__in=tournament_ids).update(status=ARCHIVED)
+
+
+def is_archived(tournament_id):
+    '''
+    True when the rows of the tournament live in the archive tables
+    '''
+    return Tournament.objects.filter(id=tournament_id, status=ARCHIVED).exists()
+
+
+def scores(tournament_id):
+    '''
+    Score rows of a tournament, hot or archived
+    '''
+    if is_archived(tournament_id):
+        return ArchivedScore.objects.filter(tournament_id=tournament_id)
+    return TournamentPlayer.objects.filter(tournament_id=tournament_id)
+
+
+def questions(tournament_id):
+    '''
+    Questions of a tournament, archived ones as dicts with the model's fields
+    '''
+    if is_archived(tournament_id):
+        question_set = ArchivedQuestionSet.objects.filter(tournament_id=tournament_id).first()
+        return question_set.questions if question_set else []
+    return Question.objects.filter(tournament_id=tournament_id)
@@ -0,0 +1,239 @@
+'''
+Live leaderboard pushed to browsers with server-sent events.
+
+The results view publishes each recorded score once to the broker, which
+fans the event out to every open stream of that tournament, so N viewers
+cost one publish instead of N refresh loops. LocalBroker only reaches the
+streams of its own process and serves tests and development; on PostgreSQL
+PostgresBroker carries the events to the streams of every worker and dyno.
+The request only publishes the player and score; each process with open
+streams of the tournament ranks the score once, for all of its streams.
+Under write-behind scoring the rank leaves out the scores still queued.
+Streams are served by a plain ASGI handler (see tournament/asgi.py) because
+Django's own response handling cannot hold an async response open.
+'''
+import asyncio
+import json
+import logging
+import os
+import re
+import select
+import threading
+import time
+from http.cookies import SimpleCookie
+from importlib import import_module
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections, connections
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+from .models import TournamentPlayer
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = re.compile(r'^/tournaments/(?P<tournament_id>\d+)/highscore/stream$')
+
+# seconds between keep-alive comments so proxies do not close idle streams
+KEEPALIVE = 15
+
+
+class LocalBroker:
+    '''
+    In-process publisher, one subscriber set per tournament. Safe to publish
+    from any thread; events are handed to each subscriber's event loop.
+    '''
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, tournament_id):
+        '''Register a subscriber in the running event loop, returns its queue'''
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(tournament_id, set()).add(
+                (asyncio.get_event_loop(), queue))
+        return queue
+
+    def unsubscribe(self, tournament_id, queue):
+        '''Remove a subscriber queue'''
+        with self._lock:
+            subscribers = self._subscribers.get(tournament_id, set())
+            subscribers.difference_update({sub for sub in subscribers if sub[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(tournament_id, None)
+
+    def has_subscribers(self, tournament_id):
+        '''True when at least one stream of the tournament is open in this process'''
+        return tournament_id in self._subscribers
+
+    def publish(self, tournament_id, event):
+        '''
+        Hand the score event to every subscriber of the tournament, ranked
+        once here. Nothing is queried when nobody is subscribed.
+        '''
+        with self._lock:
+            subscribers = list(self._subscribers.get(tournament_id, ()))
+        if not subscribers:
+            return
+        event = {'player': event['player'], 'score': event['score'],
+                 'rank': rank(tournament_id, event['player_id'], event['score'])}
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:  # event loop already closed
+                self.unsubscribe(tournament_id, queue)
+
+
+def _offer(queue, event):
+    '''Queue an event, dropping the oldest one for slow subscribers'''
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class PostgresBroker(LocalBroker):
+    '''
+    Cross-process publisher over PostgreSQL LISTEN/NOTIFY. Events are sent
+    with NOTIFY on CHANNEL and delivered when the publishing transaction
+    commits; every process with open streams LISTENs on a connection of its
+    own and fans the events out to its local subscribers.
+    '''
+    CHANNEL = 'leaderboard'
+
+    def __init__(self, queue_size=100, alias='default'):
+        super().__init__(queue_size)
+        self.alias = alias
+        self._listener_pid = None
+
+    def subscribe(self, tournament_id):
+        self._listen()
+        return super().subscribe(tournament_id)
+
+    def publish(self, tournament_id, event):
+        '''Notify every listening process, which ranks the score for its streams'''
+        payload = json.dumps({'tournament': tournament_id, 'event': event})
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.CHANNEL, payload])
+
+    def deliver(self, payload):
+        '''Fan a received notification out to the local subscribers'''
+        message = json.loads(payload)
+        # the listener thread queries like a request, on a usable connection
+        close_old_connections()
+        super().publish(message['tournament'], message['event'])
+
+    def _listen(self):
+        '''Start the listener thread of the current process, once after a fork'''
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        '''Listener thread loop, reconnecting after a lost connection'''
+        while True:
+            try:
+                self._receive()
+            except Exception:  # keep listening, events meanwhile are missed
+                logger.exception('leaderboard listener failed, reconnecting')
+                time.sleep(1)
+
+    def _receive(self):
+        import psycopg2  # only needed by this broker
+        params = connections[self.alias].get_connection_params()
+        listener = psycopg2.connect(**params)
+        try:
+            listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.CHANNEL}')
+            while True:
+                if select.select([listener], [], [], KEEPALIVE) == ([], [], []):
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    self.deliver(listener.notifies.pop(0).payload)
+        finally:
+            listener.close()
+
+
+broker = import_string(settings.LEADERBOARD_BROKER)()
+
+
+def publish_score(tournament_id, player, score):
+    '''
+    Publish a newly recorded score, ranked by the processes that stream it
+    '''
+    broker.publish(tournament_id, {'player': player.username, 'player_id': player.pk,
+                                   'score': score})
+
+
+def rank(tournament_id, player_id, score):
+    '''Rank of a score among the completed participations of the tournament'''
+    return TournamentPlayer.objects.filter(tournament_id=tournament_id,
+                                           complete_date__isnull=False,
+                                           score__gt=score).exclude(player_id=player_id).count() + 1
+
+
+def session_user_id(scope):
+    '''
+    Id of the user logged in with the request's session cookie, or None. The
+    session is verified as for any request, so one invalidated by a password
+    change is refused.
+    '''
+    cookie = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookie.load(value.decode('latin-1'))
+    if settings.SESSION_COOKIE_NAME not in cookie:
+        return None
+    engine = import_module(settings.SESSION_ENGINE)
+    request = HttpRequest()
+    request.session = engine.SessionStore(cookie[settings.SESSION_COOKIE_NAME].value)
+    try:
+        return get_user(request).pk
+    finally:
+        close_old_connections()
+
+
+async def leaderboard_stream(scope, receive, send, tournament_id):
+    '''
+    ASGI handler streaming a tournament's score events as server-sent events
+    '''
+    if await sync_to_async(session_user_id, thread_sensitive=True)(scope) is None:
+        await send({'type': 'http.response.start', 'status': 403,
+                    'headers': [(b'content-type', b'text/plain')]})
+        await send({'type': 'http.response.body', 'body': b'Forbidden'})
+        return
+    queue = broker.subscribe(tournament_id)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'),
+                                (b'cache-control', b'no-cache'),
+                                (b'x-accel-buffering', b'no')]})
+        await send({'type': 'http.response.body', 'body': b': connected\n\n', 'more_body': True})
+        while True:
+            event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({event, disconnect}, timeout=KEEPALIVE,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if disconnect in done:
+                event.cancel()
+                break
+            if event in done:
+                body = 'event: score\ndata: ' + json.dumps(event.result()) + '\n\n'
+            else:
+                event.cancel()
+                body = ': keep-alive\n\n'
+            await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+    finally:
+        disconnect.cancel()
+        broker.unsubscribe(tournament_id, queue)
+
+
+async def _wait_for_disconnect(receive):
+    '''Consume request messages until the client goes away'''
+    while (await receive())['type'] != 'http.disconnect':
+        pass
@@ -0,0 +1,28 @@
+'''
+Management command that runs the tournament lifecycle, meant to be scheduled
+daily (e.g. Heroku Scheduler) shortly after midnight
+'''
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from tournaments import lifecycle, snapshots
+
+
+class Command(BaseCommand):
+    help = ('Advance tournament statuses, publish the leaderboards of closed tournaments '
+            'and archive tournaments closed past the retention window')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int,
+                            default=settings.TOURNAMENT_ARCHIVE_AFTER_DAYS,
+                            help='days a closed tournament stays in the hot tables')
+
+    def handle(self, *args, **options):
+        closed = lifecycle.advance()
+        self.stdout.write(f'{len(closed)} tournaments closed')
+        for tournament_id in closed:
+            snapshots.publish(tournament_id)
+        published = snapshots.publish_missing()
+        self.stdout.write(f'{len(closed) + len(published)} leaderboards published')
+        archived = lifecycle.archivable(retention_days=options['retention_days'])
+        lifecycle.archive(archived)
+        self.stdout.write(f'{len(archived)} tournaments archived')
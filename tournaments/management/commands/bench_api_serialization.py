@@ -0,0 +1,64 @@
+'''
+Management command comparing the tournament api serialization paths:
+TournamentSerializer with the default JSON renderer against the .values()
+read path with the fast renderer. The tournaments are created in a
+transaction that is rolled back afterwards.
+'''
+import datetime
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from tournaments.models import Tournament
+from tournaments.renderers import FastJSONRenderer
+from tournaments.serializers import TournamentSerializer, TournamentReadSerializer
+
+
+class Rollback(Exception):
+    '''raised to roll the benchmark data back'''
+
+
+class Command(BaseCommand):
+    help = 'Benchmark tournament api serialization throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='number of tournaments')
+        parser.add_argument('--repeat', type=int, default=5, help='runs per path, best is kept')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                today = datetime.date.today()
+                Tournament.objects.bulk_create(
+                    Tournament(name=f'Tournament {i}', category='21', difficulty='easy',
+                               start_date=today, end_date=today)
+                    for i in range(options['count']))
+                self.run(options['count'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, count, repeat):
+        '''time both paths, query included'''
+        def model_path():
+            data = TournamentSerializer(Tournament.objects.all(), many=True).data
+            return JSONRenderer().render(data)
+
+        def read_path():
+            rows = Tournament.objects.values(*TournamentSerializer.Meta.fields)
+            return FastJSONRenderer().render(TournamentReadSerializer(rows, many=True).data)
+
+        results = {}
+        for name, path in (('ModelSerializer + JSONRenderer', model_path),
+                           ('values() read path + FastJSONRenderer', read_path)):
+            best = min(self.time(path) for _ in range(repeat))
+            results[name] = best
+            self.stdout.write(f'{name:40} {best * 1000:8.1f}ms  {count / best:10.0f} tournaments/s')
+        baseline, fast = results.values()
+        self.stdout.write(f'speed-up: {baseline / fast:.1f}x')
+
+    @staticmethod
+    def time(path):
+        start = time.perf_counter()
+        path()
+        return time.perf_counter() - start
@@ -0,0 +1,96 @@
+'''
+Management command comparing peak memory and time of rendering the highscore
+and tournament list pages from model instances against the slim read
+models. The benchmark data is created in a transaction that is rolled back.
+'''
+import datetime
+import time
+import tracemalloc
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Avg
+from django.template.loader import render_to_string
+from tournaments import read_models, snapshots
+from tournaments.models import Tournament, TournamentPlayer
+
+
+class Rollback(Exception):
+    '''raised to roll the benchmark data back'''
+
+
+class Command(BaseCommand):
+    help = 'Benchmark memory and time of template rendering with and without read models'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=5000, help='leaderboard entries')
+        parser.add_argument('--tournaments', type=int, default=5000, help='listed tournaments')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                tournament_id = self.setup(options['players'], options['tournaments'])
+                self.compare('highscore', lambda: self.model_highscore(tournament_id),
+                             lambda: render_to_string('highscore.html',
+                                                      snapshots.leaderboard(tournament_id)))
+                self.compare('tournament list',
+                             lambda: render_to_string('tournaments_list.html',
+                                                      {'tournaments': Tournament.objects.all()}),
+                             lambda: render_to_string(
+                                 'tournaments_list.html',
+                                 {'tournaments': read_models.tournaments(Tournament.objects.all())}))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def setup(self, players, tournaments):
+        '''tournaments and one tournament played by every player'''
+        today = datetime.date.today()
+        Tournament.objects.bulk_create(
+            Tournament(name=f'Tournament {i}', category='21', difficulty='easy',
+                       start_date=today, end_date=today)
+            for i in range(tournaments - 1))
+        tournament = Tournament.objects.create(name='Benchmark', category='21', difficulty='easy',
+                                               start_date=today, end_date=today)
+        User.objects.bulk_create(User(username=f'benchmark{i}', password='!')
+                                 for i in range(players))
+        TournamentPlayer.objects.bulk_create(
+            TournamentPlayer(tournament=tournament, player_id=player_id, score=index % 11,
+                             complete_date=today)
+            for index, player_id in enumerate(User.objects.filter(
+                username__startswith='benchmark').values_list('id', flat=True)))
+        return tournament.id
+
+    @staticmethod
+    def model_highscore(tournament_id):
+        '''the highscore page as rendered from model instances'''
+        tour_play = TournamentPlayer.objects.filter(
+            tournament_id=tournament_id).select_related('player').order_by('-score')
+        return render_to_string('highscore.html',
+                                {'tour_play': tour_play,
+                                 'total_taken': tour_play.count(),
+                                 'average': tour_play.aggregate(Avg('score'))})
+
+    def compare(self, name, model_path, read_path):
+        '''peak memory and time of both paths'''
+        results = [self.measure(path) for path in (model_path, read_path)]
+        for label, (peak, seconds) in zip(('model instances', 'read models'), results):
+            self.stdout.write(f'{name:16} {label:16} peak {peak / 2 ** 20:7.1f} MiB  '
+                              f'{seconds * 1000:8.1f}ms')
+        (model_peak, model_time), (read_peak, read_time) = results
+        self.stdout.write(f'{name:16} memory {model_peak / read_peak:.1f}x less, '
+                          f'{model_time / read_time:.1f}x faster')
+
+    @staticmethod
+    def measure(path):
+        # time without tracing, tracemalloc slows allocation down
+        start = time.perf_counter()
+        path()
+        seconds = time.perf_counter() - start
+        tracemalloc.start()
+        try:
+            path()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return peak, seconds
@@ -0,0 +1,79 @@
+'''
+Management command measuring quiz endpoint latency during a sign-up storm,
+with passwords hashed inline in the request threads and in the hashing pool.
+The benchmark data is created in a transaction that is rolled back.
+'''
+import datetime
+import statistics
+import threading
+import time
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from tournaments.hashers import PooledPBKDF2PasswordHasher
+from tournaments.models import Tournament, Question
+
+
+class Rollback(Exception):
+    '''raised to roll the benchmark data back'''
+
+
+class Command(BaseCommand):
+    help = 'Benchmark quiz latency while passwords are being hashed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='quiz requests per run')
+        parser.add_argument('--signups', type=int, default=8,
+                            help='concurrent threads hashing passwords')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                url = self.setup()
+                for label, hasher in (('no storm', None),
+                                      ('storm, inline hashing', PBKDF2PasswordHasher()),
+                                      ('storm, pooled hashing', PooledPBKDF2PasswordHasher())):
+                    latencies = self.run(url, hasher, options['requests'], options['signups'])
+                    self.stdout.write(f'{label:24} p50 {statistics.median(latencies):7.1f}ms  '
+                                      f'p95 {latencies[int(len(latencies) * 0.95)]:7.1f}ms')
+                raise Rollback
+        except Rollback:
+            pass
+
+    def setup(self):
+        '''a tournament with ten questions and a logged in player'''
+        today = datetime.date.today()
+        tournament = Tournament.objects.create(name='Benchmark', category='21', difficulty='easy',
+                                               start_date=today, end_date=today)
+        Question.objects.bulk_create(
+            Question(tournament=tournament, question=f'Question {i}', correct_answer='a',
+                     choices1='a', choices2='b', choices3='c', choices4='d')
+            for i in range(10))
+        self.client = Client(HTTP_HOST='127.0.0.1')
+        self.client.force_login(User.objects.create(username='benchmark'))
+        return reverse('tournament:quiz_questions', kwargs={'tournament_id': tournament.id})
+
+    def run(self, url, hasher, requests, signups):
+        '''sorted latencies in ms of quiz requests while the signup threads hash'''
+        stop = threading.Event()
+
+        def signup():
+            while not stop.is_set():
+                hasher.encode('P@ssw0rd123', hasher.salt())
+        threads = [threading.Thread(target=signup) for _ in range(signups if hasher else 0)]
+        for thread in threads:
+            thread.start()
+        latencies = []
+        try:
+            for _ in range(requests):
+                start = time.perf_counter()
+                self.client.get(url)
+                latencies.append((time.perf_counter() - start) * 1000)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return sorted(latencies)
@@ -0,0 +1,14 @@
+'''
+Management command that applies every journaled write-behind score, including
+journals left behind by crashed workers
+'''
+from django.core.management.base import BaseCommand
+from tournaments.writebehind import score_queue
+
+
+class Command(BaseCommand):
+    help = 'Apply queued write-behind scores to the database'
+
+    def handle(self, *args, **options):
+        updated = score_queue.flush(wait=True)
+        self.stdout.write(f'{updated} scores applied')
@@ -0,0 +1,20 @@
+'''
+Management command recreating the full-text search index and refilling it
+from the tournament and question rows, e.g. after rows were written while
+its triggers were missing. Dropped triggers themselves are recreated after
+every migrate.
+'''
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from tournaments import search
+from tournaments.models import Tournament, Question
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of tournaments and questions'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(f'Search index rebuilt: {Tournament.objects.count()} tournaments, '
+                          f'{Question.objects.count()} questions')
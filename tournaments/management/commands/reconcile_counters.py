@@ -0,0 +1,15 @@
+'''
+Management command recomputing the participant, completion and question
+counts of every tournament from its rows and repairing any drift.
+'''
+from django.core.management.base import BaseCommand
+from tournaments import counters
+
+
+class Command(BaseCommand):
+    help = 'Repair the denormalized tournament counters'
+
+    def handle(self, *args, **options):
+        drifted = counters.reconcile()
+        self.stdout.write(f'{len(drifted)} tournaments repaired'
+                          + (f': {", ".join(map(str, drifted))}' if drifted else ''))
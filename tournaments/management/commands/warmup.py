@@ -0,0 +1,61 @@
+'''
+Management command that runs the worker warm-up, or measures the cold-start
+latency of a fresh process with and without it
+'''
+import json
+import subprocess
+import sys
+import time
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from tournament.warmup import warm_up
+
+# pages that can be requested without logging in
+PROBE_URLS = ['tournament:index', 'tournament:signup', 'login']
+
+
+class Command(BaseCommand):
+    help = 'Warm up URL resolvers, templates and caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--measure', action='store_true',
+                            help='compare first-request latency of fresh processes '
+                                 'with and without warm-up')
+        parser.add_argument('--runs', type=int, default=3,
+                            help='fresh processes started per variant with --measure')
+        parser.add_argument('--probe', action='store_true', help='internal: time first requests')
+        parser.add_argument('--no-warmup', action='store_true', help='internal: skip warm-up')
+
+    def handle(self, *args, **options):
+        if options['probe']:
+            self.probe(warm=not options['no_warmup'])
+        elif options['measure']:
+            self.measure(options['runs'])
+        else:
+            for name, count, seconds in warm_up():
+                self.stdout.write(f'{name}: {count} in {seconds * 1000:.1f}ms')
+
+    def probe(self, warm):
+        '''Time the first request to each probe url in this (fresh) process'''
+        if warm:
+            warm_up()
+        client = Client(HTTP_HOST='127.0.0.1')
+        timings = {}
+        for name in PROBE_URLS:
+            start = time.perf_counter()
+            client.get(reverse(name))
+            timings[name] = (time.perf_counter() - start) * 1000
+        self.stdout.write(json.dumps(timings))
+
+    def measure(self, runs):
+        '''Start fresh processes and report the mean first-request latency'''
+        for label, extra in (('cold', ['--no-warmup']), ('warm', [])):
+            totals = dict.fromkeys(PROBE_URLS, 0.0)
+            for _ in range(runs):
+                output = subprocess.run([sys.executable, sys.argv[0], 'warmup', '--probe'] + extra,
+                                        check=True, capture_output=True, text=True).stdout
+                for name, ms in json.loads(output.splitlines()[-1]).items():
+                    totals[name] += ms
+            for name in PROBE_URLS:
+                self.stdout.write(f'{label:5} {name:20} {totals[name] / runs:8.1f}ms')
@@ -0,0 +1,52 @@
+# Generated by Django 3.1.2 on 2026-10-19 12:39
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_status(apps, schema_editor):
+    '''derive the status of the existing tournaments from their dates'''
+    Tournament = apps.get_model('tournaments', 'Tournament')
+    today = datetime.date.today()
+    Tournament.objects.filter(end_date__lt=today).update(status='closed')
+    Tournament.objects.filter(start_date__lte=today, end_date__gte=today).update(status='ongoing')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tournaments', '0010_auto_20200606_1300'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedQuestionSet',
+            fields=[
+                ('tournament', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='tournaments.tournament')),
+                ('questions', models.JSONField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='status',
+            field=models.CharField(choices=[('upcoming', 'Upcoming'), ('ongoing', 'Ongoing'), ('closed', 'Closed'), ('archived', 'Archived')], db_index=True, default='upcoming', max_length=20),
+        ),
+        migrations.RunPython(set_status, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='ArchivedScore',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveSmallIntegerField()),
+                ('complete_date', models.DateField(null=True, verbose_name='complete_date')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tournaments.tournament')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedscore',
+            index=models.Index(fields=['tournament', '-score'], name='tournaments_tournam_d0e647_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.2 on 2026-10-19 12:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0011_tournament_status_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tournament',
+            name='category',
+            field=models.CharField(choices=[('21', 'Sports'), ('22', 'Geography'), ('23', 'History'), ('25', 'Art')], db_index=True, max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='tournament',
+            name='difficulty',
+            field=models.CharField(choices=[('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard')], db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='tournament',
+            name='end_date',
+            field=models.DateField(db_index=True, verbose_name='end date'),
+        ),
+        migrations.AlterField(
+            model_name='tournament',
+            name='start_date',
+            field=models.DateField(db_index=True, verbose_name='start date'),
+        ),
+        migrations.AlterField(
+            model_name='tournamentplayer',
+            name='complete_date',
+            field=models.DateField(db_index=True, null=True, verbose_name='complete_date'),
+        ),
+    ]
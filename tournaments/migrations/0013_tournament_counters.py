@@ -0,0 +1,52 @@
+# Generated by Django 3.1.2 on 2026-10-19 12:54
+
+from collections import Counter
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_rows(apps, schema_editor):
+    '''fill the counters of the existing tournaments'''
+    Tournament = apps.get_model('tournaments', 'Tournament')
+    counts = {}
+    for field, model, filters in (
+            ('participant_count', 'TournamentPlayer', {}),
+            ('participant_count', 'ArchivedScore', {}),
+            ('completion_count', 'TournamentPlayer', {'complete_date__isnull': False}),
+            ('completion_count', 'ArchivedScore', {'complete_date__isnull': False}),
+            ('question_count', 'Question', {})):
+        rows = apps.get_model('tournaments', model).objects.filter(**filters).values(
+            'tournament').annotate(count=Count('pk')).values_list('tournament', 'count')
+        for tournament_id, count in rows:
+            counts.setdefault(tournament_id, Counter())[field] += count
+    for question_set in apps.get_model('tournaments', 'ArchivedQuestionSet').objects.all():
+        counts.setdefault(question_set.tournament_id, Counter())['question_count'] += len(
+            question_set.questions)
+    for tournament_id, fields in counts.items():
+        Tournament.objects.filter(id=tournament_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0012_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='completion_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tournament',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
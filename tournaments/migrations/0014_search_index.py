@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# the full-text index as it was created by this migration, FTS5 on SQLite and
+# tsvector on PostgreSQL. Kept inline so later changes to tournaments.search
+# do not change what this migration does; search.install() brings it up to
+# date after every migrate.
+INDEXED = {'tournaments_tournament': 'name', 'tournaments_question': 'question'}
+
+
+def sqlite_sql(table, column):
+    fts = f'{table}_fts'
+    delete = (f"INSERT INTO {fts}({fts}, rowid, {column}) "
+              f"VALUES ('delete', old.id, old.{column});")
+    insert = f'INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column} ON {table} '
+        f'BEGIN {delete} {insert} END',
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def postgresql_sql(table, column):
+    return [
+        f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        f'CREATE INDEX IF NOT EXISTS {table}_search_vector ON {table} USING GIN (search_vector)',
+        f'DROP TRIGGER IF EXISTS {table}_search_vector ON {table}',
+        f'CREATE TRIGGER {table}_search_vector BEFORE INSERT OR UPDATE OF {column} ON {table} '
+        f"FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger(search_vector, "
+        f"'pg_catalog.simple', {column})",
+        f"UPDATE {table} SET search_vector = to_tsvector('simple', {column})",
+    ]
+
+
+def sqlite_drop_sql(table, column):
+    return [f'DROP TRIGGER IF EXISTS {table}_fts_{trigger}'
+            for trigger in ('insert', 'delete', 'update')] + [f'DROP TABLE IF EXISTS {table}_fts']
+
+
+def postgresql_drop_sql(table, column):
+    return [f'DROP TRIGGER IF EXISTS {table}_search_vector ON {table}',
+            f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector']
+
+
+def run(schema_editor, statements):
+    sql = statements.get(schema_editor.connection.vendor)
+    if sql is None:  # other databases search without an index
+        return
+    for table, column in INDEXED.items():
+        for statement in sql(table, column):
+            schema_editor.execute(statement, params=None)
+
+
+def install(apps, schema_editor):
+    '''create and fill the full-text index'''
+    run(schema_editor, {'sqlite': sqlite_sql, 'postgresql': postgresql_sql})
+
+
+def uninstall(apps, schema_editor):
+    run(schema_editor, {'sqlite': sqlite_drop_sql, 'postgresql': postgresql_drop_sql})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0013_tournament_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
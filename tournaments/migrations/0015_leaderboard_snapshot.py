@@ -0,0 +1,22 @@
+# Generated by Django 3.1.2 on 2026-10-19 13:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tournaments', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardSnapshot',
+            fields=[
+                ('tournament', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='tournaments.tournament')),
+                ('leaderboard', models.JSONField()),
+                ('published', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
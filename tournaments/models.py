@@ -1,21 +1,76 @@
 '''
 Python class that holds the models of the tournaments application
 '''
+import datetime
 from django.db import models
 from django.contrib.auth.models import User
 
 DIFFICULTY_CHOICE = [('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard')]
 CATEGORY_CHOICE = [('21', 'Sports'), ('22', 'Geography'), ('23', 'History'), ('25', 'Art')]
+UPCOMING, ONGOING, CLOSED, ARCHIVED = 'upcoming', 'ongoing', 'closed', 'archived'
+STATUS_CHOICE = [(UPCOMING, 'Upcoming'), (ONGOING, 'Ongoing'), (CLOSED, 'Closed'),
+                 (ARCHIVED, 'Archived')]
 
 class Tournament(models.Model):
     '''
     tournament model
     '''
     name = models.CharField(max_length=100)
-    category = models.CharField(max_length=200, choices=CATEGORY_CHOICE)
-    difficulty = models.CharField(max_length=50, choices=DIFFICULTY_CHOICE)
-    start_date = models.DateField('start date')
-    end_date = models.DateField('end date')
+    category = models.CharField(max_length=200, choices=CATEGORY_CHOICE, db_index=True)
+    difficulty = models.CharField(max_length=50, choices=DIFFICULTY_CHOICE, db_index=True)
+    start_date = models.DateField('start date', db_index=True)
+    end_date = models.DateField('end date', db_index=True)
+    # kept in step with the dates by save() and the advance_tournaments command,
+    # the admin may close a tournament before its end date
+    status = models.CharField(max_length=20, choices=STATUS_CHOICE, default=UPCOMING,
+                              db_index=True)
+    # denormalized counts, kept up to date by tournaments.counters
+    participant_count = models.PositiveIntegerField(default=0)
+    completion_count = models.PositiveIntegerField(default=0)
+    question_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        '''
+        remember the dates the tournament was loaded with, see save()
+        '''
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_dates = (instance.__dict__.get('start_date'),
+                                  instance.__dict__.get('end_date'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        '''
+        derive the status from the dates. Archived tournaments stay archived,
+        closed ones stay closed unless their dates are changed, so closing a
+        tournament early holds when it is edited
+        '''
+        closed_early = (self.status == CLOSED
+                        and self.dates() == getattr(self, '_loaded_dates', None))
+        if self.status != ARCHIVED and not closed_early:
+            self.status = self.status_on(datetime.date.today())
+        super().save(*args, **kwargs)
+
+    def dates(self):
+        '''
+        start and end date, as dates even when assigned as strings
+        '''
+        return (self._meta.get_field('start_date').to_python(self.start_date),
+                self._meta.get_field('end_date').to_python(self.end_date))
+
+    def status_on(self, day):
+        '''
+        status of the tournament on the given day
+        '''
+        start_date, end_date = self.dates()
+        if end_date < day:
+            return CLOSED
+        if start_date <= day:
+            return ONGOING
+        return UPCOMING
 
 class Question(models.Model):
     '''
@@ -36,4 +91,31 @@ class TournamentPlayer(models.Model):
     tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE)
     player = models.ForeignKey(User, on_delete=models.CASCADE)
     score = models.IntegerField(default=0)
+    complete_date = models.DateField('complete_date', null=True, db_index=True)
+
+class ArchivedScore(models.Model):
+    '''
+    compact copy of a TournamentPlayer row once its tournament is archived
+    '''
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE)
+    player = models.ForeignKey(User, on_delete=models.CASCADE)
+    score = models.PositiveSmallIntegerField()
     complete_date = models.DateField('complete_date', null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['tournament', '-score'])]
+
+class ArchivedQuestionSet(models.Model):
+    '''
+    questions of an archived tournament, stored as one json list
+    '''
+    tournament = models.OneToOneField(Tournament, on_delete=models.CASCADE, primary_key=True)
+    questions = models.JSONField()
+
+class LeaderboardSnapshot(models.Model):
+    '''
+    final leaderboard of a closed tournament, the document of the highscore json
+    '''
+    tournament = models.OneToOneField(Tournament, on_delete=models.CASCADE, primary_key=True)
+    leaderboard = models.JSONField()
+    published = models.DateTimeField(auto_now=True)
@@ -0,0 +1,145 @@
+'''
+On-demand sampling profiler for production requests.
+
+A request is profiled when it carries a profile token, issued to admins by
+the profile_token endpoint and sent in the X-Profile-Token header or the
+profile query parameter, or when it is drawn by the sample rate configured
+for its url name in PROFILING['SAMPLE_RATES']. A background thread then
+samples the stack of the request thread every PROFILING['INTERVAL'] seconds
+and the samples are written as collapsed stacks ("frame;frame;frame count"
+lines, the input of flamegraph.pl and speedscope) to PROFILING['DIRECTORY'],
+which keeps at most MAX_FILES files of at most MAX_AGE seconds.
+
+Unprofiled requests only pay for a header lookup and a random draw, and with
+profiling disabled the middleware is not loaded at all.
+'''
+import datetime
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+TOKEN_SALT = 'tournaments.profiling'
+# tokens are accepted for an hour after they were issued
+TOKEN_MAX_AGE = 60 * 60
+ANY_URL = '*'
+
+
+def make_token(url_name=ANY_URL):
+    '''signed token enabling profiling of requests to url_name, or to any url'''
+    return signing.dumps(url_name, salt=TOKEN_SALT)
+
+
+def token_allows(token, url_name):
+    '''True when the token is valid, unexpired and issued for the url name'''
+    try:
+        allowed = signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return allowed in (ANY_URL, url_name)
+
+
+class StackSampler:
+    '''
+    Samples the stack of one thread from a background thread and counts the
+    collapsed stacks
+    '''
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def write(self, path):
+        '''write the samples in collapsed stack format'''
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+def collapse(frame):
+    '''the stack of a frame as one line, outermost frame first'''
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{frame.f_globals.get("__name__", "?")}:{code.co_name}:{frame.f_lineno}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def prune(directory, max_files, max_age):
+    '''drop profiles older than max_age seconds and the oldest beyond max_files'''
+    profiles = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.folded'):
+            profiles.append((entry.stat().st_mtime, entry.path))
+    profiles.sort(reverse=True)
+    now = time.time()
+    for index, (modified, path) in enumerate(profiles):
+        if index >= max_files or now - modified > max_age:
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # pruned by another worker
+                pass
+
+
+class ProfilingMiddleware:
+    '''
+    Profile the requests that carry a profile token or are sampled for
+    their url name
+    '''
+    def __init__(self, get_response):
+        config = settings.PROFILING
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = config['DIRECTORY']
+        self.interval = config['INTERVAL']
+        self.sample_rates = config['SAMPLE_RATES']
+        self.max_files = config['MAX_FILES']
+        self.max_age = config['MAX_AGE']
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        sampler = getattr(request, 'profile_sampler', None)
+        if sampler is not None:
+            sampler.stop()
+            started = datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f')
+            name = f'{request.profile_name}-{started}-{os.getpid()}-{threading.get_ident()}.folded'
+            os.makedirs(self.directory, exist_ok=True)
+            sampler.write(os.path.join(self.directory, name))
+            prune(self.directory, self.max_files, self.max_age)
+            response['X-Profile'] = name
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name or 'unnamed'
+        token = request.META.get('HTTP_X_PROFILE_TOKEN') or request.GET.get('profile')
+        if token:
+            if not token_allows(token, url_name):
+                return None
+        elif random.random() >= self.sample_rates.get(url_name, 0):
+            return None
+        request.profile_name = url_name
+        request.profile_sampler = StackSampler(threading.get_ident(), self.interval)
+        request.profile_sampler.start()
+        return None
@@ -0,0 +1,93 @@
+'''
+Slim read models for template rendering.
+
+Pages that only display rows do not need model instances: building one per
+row costs a full column fetch, the instance dict and its _state, and the
+highscore used to carry a whole User row per entry. The helpers here fetch
+only the columns a template uses with values_list() and keep each row in a
+small __slots__ object exposing the attributes the templates already use.
+'''
+from .models import CATEGORY_CHOICE, DIFFICULTY_CHOICE
+
+CATEGORIES = dict(CATEGORY_CHOICE)
+DIFFICULTIES = dict(DIFFICULTY_CHOICE)
+
+
+class TournamentRow:
+    '''
+    a tournament as listed in tournaments_list.html
+    '''
+    __slots__ = ('id', 'name', 'category', 'difficulty', 'start_date', 'end_date',
+                 'participant_count', 'question_count')
+    fields = __slots__
+
+    def __init__(self, id, name, category, difficulty, start_date, end_date,
+                 participant_count, question_count):
+        self.id = id
+        self.name = name
+        self.category = category
+        self.difficulty = difficulty
+        self.start_date = start_date
+        self.end_date = end_date
+        self.participant_count = participant_count
+        self.question_count = question_count
+
+    def get_category_display(self):
+        return CATEGORIES.get(self.category, self.category)
+
+    def get_difficulty_display(self):
+        return DIFFICULTIES.get(self.difficulty, self.difficulty)
+
+
+class QuestionRow:
+    '''
+    a question as shown in the quiz, the question list and the results
+    '''
+    __slots__ = ('id', 'question', 'correct_answer',
+                 'choices1', 'choices2', 'choices3', 'choices4', 'saved_answer')
+    fields = __slots__[:-1]
+
+    def __init__(self, id, question, correct_answer, choices1, choices2, choices3, choices4):
+        self.id = id
+        self.question = question
+        self.correct_answer = correct_answer
+        self.choices1 = choices1
+        self.choices2 = choices2
+        self.choices3 = choices3
+        self.choices4 = choices4
+        # answer autosaved by the player, set by start_tournament
+        self.saved_answer = None
+
+
+class ScoreRow:
+    '''
+    a leaderboard entry, player is the username
+    '''
+    __slots__ = ('player', 'score', 'complete_date')
+    fields = ('player__username', 'score', 'complete_date')
+
+    def __init__(self, player, score, complete_date):
+        self.player = player
+        self.score = score
+        self.complete_date = complete_date
+
+
+def tournaments(queryset):
+    '''rows of a Tournament queryset'''
+    return [TournamentRow(*row) for row in queryset.values_list(*TournamentRow.fields)]
+
+
+def questions(queryset_or_dicts):
+    '''
+    rows of a Question queryset, or of the question dicts of an archived
+    tournament
+    '''
+    if isinstance(queryset_or_dicts, list):
+        return [QuestionRow(*(question[field] for field in QuestionRow.fields))
+                for question in queryset_or_dicts]
+    return [QuestionRow(*row) for row in queryset_or_dicts.values_list(*QuestionRow.fields)]
+
+
+def scores(queryset):
+    '''rows of a TournamentPlayer or ArchivedScore queryset, in its order'''
+    return [ScoreRow(*row) for row in queryset.values_list(*ScoreRow.fields)]
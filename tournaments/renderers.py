@@ -0,0 +1,24 @@
+'''
+Renderers for the tournaments rest api
+'''
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional, fall back to the standard library encoder
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer that encodes with orjson when it is installed. Falls back to
+    the default DRF renderer otherwise.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        option = 0
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option = orjson.OPT_INDENT_2
+        # dates are handled natively, the DRF encoder covers the rest (Decimal, lazy strings)
+        return orjson.dumps(data, default=self.encoder_class().default, option=option)
@@ -0,0 +1,188 @@
+'''
+Full-text search over tournament names and question texts.
+
+The index lives in the database and is kept up to date by triggers, so every
+write path, including bulk_create(), queryset update() and delete() and the
+cascades of a deleted tournament, updates it incrementally without a hook in
+the views. On SQLite it is an external content FTS5 table per indexed table,
+ranked with bm25(); on PostgreSQL a tsvector column with a GIN index, ranked
+with ts_rank_cd(). Both tokenize without stemming, so the prefix matching of
+the last characters typed behaves the same on both. Other databases fall
+back to an unranked icontains filter.
+
+install() creates the index and rebuild() refills it from the rows. On
+SQLite a migration that rebuilds one of the indexed tables drops its
+triggers; install() runs after every migrate and creates them again.
+'''
+import re
+from django.db import connection
+from .models import Tournament, Question
+
+# indexed table: indexed column
+INDEXED = {'tournaments_tournament': 'name', 'tournaments_question': 'question'}
+WORD = re.compile(r'[^\W_]+')
+TOURNAMENT_COLUMNS = ('id', 'name', 'category', 'difficulty', 'start_date', 'end_date', 'status')
+QUESTION_COLUMNS = ('id', 'question', 'tournament_id', 'tournament_name', 'category',
+                    'difficulty')
+
+
+def sqlite_schema(table, column):
+    '''FTS5 table of the column and the triggers keeping it in step'''
+    fts = f'{table}_fts'
+    delete = (f"INSERT INTO {fts}({fts}, rowid, {column}) "
+              f"VALUES ('delete', old.id, old.{column});")
+    insert = f'INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column});'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({column}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column} ON {table} '
+        f'BEGIN {delete} {insert} END',
+    ]
+
+
+def postgresql_schema(table, column):
+    '''tsvector column of the column, its GIN index and the trigger filling it'''
+    return [
+        f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        f'CREATE INDEX IF NOT EXISTS {table}_search_vector ON {table} USING GIN (search_vector)',
+        f'DROP TRIGGER IF EXISTS {table}_search_vector ON {table}',
+        f'CREATE TRIGGER {table}_search_vector BEFORE INSERT OR UPDATE OF {column} ON {table} '
+        f"FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger(search_vector, "
+        f"'pg_catalog.simple', {column})",
+    ]
+
+
+def install(db=connection):
+    '''create the index of the database, if it has none yet'''
+    schema = {'sqlite': sqlite_schema, 'postgresql': postgresql_schema}.get(db.vendor)
+    if schema is None:
+        return
+    with db.cursor() as cursor:
+        for table, column in INDEXED.items():
+            for statement in schema(table, column):
+                cursor.execute(statement)
+
+
+def uninstall(db=connection):
+    '''drop the index'''
+    with db.cursor() as cursor:
+        for table, column in INDEXED.items():
+            if db.vendor == 'sqlite':
+                for trigger in ('insert', 'delete', 'update'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{trigger}')
+                cursor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+            elif db.vendor == 'postgresql':
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector ON {table}')
+                cursor.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+
+
+def rebuild(db=connection):
+    '''create the index if it is missing and refill it from the rows'''
+    install(db)
+    with db.cursor() as cursor:
+        for table, column in INDEXED.items():
+            if db.vendor == 'sqlite':
+                cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+            elif db.vendor == 'postgresql':
+                cursor.execute(f"UPDATE {table} SET search_vector = to_tsvector('simple', {column})")
+
+
+def words(text):
+    '''the search words of the text, lowercased'''
+    return WORD.findall(text.lower())
+
+
+def match_expression(terms, vendor):
+    '''
+    query of all the terms, each matched as a prefix: "foot ball" finds
+    "Football ballads"
+    '''
+    if vendor == 'sqlite':
+        return ' '.join(f'"{term}"*' for term in terms)
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def filters(category, difficulty):
+    '''where clauses and params of the tournament filters'''
+    clauses, params = [], []
+    for column, value in (('category', category), ('difficulty', difficulty)):
+        if value:
+            clauses.append(f' AND t.{column} = %s')
+            params.append(value)
+    return ''.join(clauses), params
+
+
+def search_tournaments(text, category=None, difficulty=None, limit=20):
+    '''
+    tournaments whose name matches the text, best match first, as dicts
+    with a score, higher being better
+    '''
+    terms = words(text)
+    if not terms:
+        return []
+    where, params = filters(category, difficulty)
+    columns = ', '.join(f't.{column}' for column in TOURNAMENT_COLUMNS)
+    if connection.vendor == 'sqlite':
+        sql = (f'SELECT {columns}, -bm25(tournaments_tournament_fts) AS score '
+               'FROM tournaments_tournament_fts '
+               'JOIN tournaments_tournament t ON t.id = tournaments_tournament_fts.rowid '
+               f'WHERE tournaments_tournament_fts MATCH %s{where} '
+               'ORDER BY score DESC, t.id LIMIT %s')
+    elif connection.vendor == 'postgresql':
+        sql = (f'SELECT {columns}, ts_rank_cd(t.search_vector, query) AS score '
+               "FROM tournaments_tournament t, to_tsquery('simple', %s) query "
+               f'WHERE t.search_vector @@ query{where} '
+               'ORDER BY score DESC, t.id LIMIT %s')
+    else:
+        queryset = Tournament.objects.filter(name__icontains=text.strip())
+        queryset = queryset.filter(**{field: value for field, value in (
+            ('category', category), ('difficulty', difficulty)) if value})
+        return [dict(row, score=0.0)
+                for row in queryset.order_by('id').values(*TOURNAMENT_COLUMNS)[:limit]]
+    return run(sql, [match_expression(terms, connection.vendor)] + params + [limit],
+               TOURNAMENT_COLUMNS)
+
+
+def search_questions(text, category=None, difficulty=None, limit=20):
+    '''
+    questions whose text matches the text, best match first, as dicts with
+    their tournament and a score. Questions of archived tournaments are kept
+    in the archive and are not searched.
+    '''
+    terms = words(text)
+    if not terms:
+        return []
+    where, params = filters(category, difficulty)
+    columns = 'q.id, q.question, q.tournament_id, t.name, t.category, t.difficulty'
+    if connection.vendor == 'sqlite':
+        sql = (f'SELECT {columns}, -bm25(tournaments_question_fts) AS score '
+               'FROM tournaments_question_fts '
+               'JOIN tournaments_question q ON q.id = tournaments_question_fts.rowid '
+               'JOIN tournaments_tournament t ON t.id = q.tournament_id '
+               f'WHERE tournaments_question_fts MATCH %s{where} '
+               'ORDER BY score DESC, q.id LIMIT %s')
+    elif connection.vendor == 'postgresql':
+        sql = (f'SELECT {columns}, ts_rank_cd(q.search_vector, query) AS score '
+               "FROM tournaments_question q, to_tsquery('simple', %s) query, "
+               'tournaments_tournament t '
+               f'WHERE q.search_vector @@ query AND t.id = q.tournament_id{where} '
+               'ORDER BY score DESC, q.id LIMIT %s')
+    else:
+        queryset = Question.objects.filter(question__icontains=text.strip())
+        queryset = queryset.filter(**{f'tournament__{field}': value for field, value in (
+            ('category', category), ('difficulty', difficulty)) if value})
+        rows = queryset.order_by('id').values_list(
+            'id', 'question', 'tournament_id', 'tournament__name', 'tournament__category',
+            'tournament__difficulty')[:limit]
+        return [dict(zip(QUESTION_COLUMNS, row), score=0.0) for row in rows]
+    return run(sql, [match_expression(terms, connection.vendor)] + params + [limit],
+               QUESTION_COLUMNS)
+
+
+def run(sql, params, columns):
+    '''rows of the search query as dicts'''
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [dict(zip(columns + ('score',), row)) for row in cursor.fetchall()]
@@ -6,7 +6,9 @@ class TournamentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tournament
-        fields = ['id','name', 'category', 'difficulty', 'start_date', 'end_date']
+        fields = ['id','name', 'category', 'difficulty', 'start_date', 'end_date', 'status',
+                  'participant_count', 'completion_count', 'question_count']
+        read_only_fields = ['status', 'participant_count', 'completion_count', 'question_count']
 
     def validate(self, data):
         """
@@ -16,4 +18,22 @@ class TournamentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("finish must occur after start")
         if datetime.date.today() > data['end_date']:
             raise serializers.ValidationError("End date must occur after today")
-        return data
\ No newline at end of file
+        return data
+
+class TournamentReadSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer for tournament rows fetched with .values(). Skips the
+    per-field machinery of ModelSerializer, rows only need their dates formatted.
+    """
+    def to_representation(self, instance):
+        data = dict(instance)
+        data['start_date'] = instance['start_date'].isoformat()
+        data['end_date'] = instance['end_date'].isoformat()
+        return data
+
+class SubmissionSerializer(serializers.Serializer):
+    """
+    Answers of one tournament, a mapping of question id to the chosen answer
+    """
+    tournament = serializers.IntegerField()
+    answers = serializers.DictField(child=serializers.CharField(allow_blank=True))
@@ -0,0 +1,143 @@
+'''
+Slow-query log with automatic EXPLAIN capture.
+
+SlowQueryMiddleware wraps the database connections of every request with an
+execute wrapper. Statements that take SLOW_QUERY_LOG['THRESHOLD_MS'] or more
+are recorded with their parameters, duration, the view that ran them and the
+project frame that issued them, together with the plan of the statement
+(EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere). The entries are kept in a
+bounded ring buffer of SLOW_QUERY_LOG['SIZE'] entries per process and are
+browsed in the admin at admin/slow-queries/.
+'''
+import datetime
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections, transaction
+from django.db.transaction import TransactionManagementError
+
+PROJECT_ROOT = settings.BASE_DIR + os.sep
+THIS_FILE = os.path.abspath(__file__)
+
+
+class SlowQueryLog:
+    '''
+    Ring buffer of the slowest recent statements of the process
+    '''
+    def __init__(self, size):
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        with self._lock:
+            self._entries.append(entry)
+
+    def entries(self):
+        '''the entries, newest first'''
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+log = SlowQueryLog(settings.SLOW_QUERY_LOG['SIZE'])
+
+# set while a plan is captured, so the EXPLAIN is not recorded itself
+_explaining = threading.local()
+
+
+def explain(connection, sql, params):
+    '''
+    plan of a SELECT statement as text, None for other statements
+    '''
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    _explaining.active = True
+    try:
+        # in a savepoint, a failed EXPLAIN must not break the caller's transaction
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return '\n'.join(' '.join(str(column) for column in row)
+                             for row in cursor.fetchall())
+    except (DatabaseError, TransactionManagementError) as error:
+        return f'EXPLAIN failed: {error}'
+    finally:
+        _explaining.active = False
+
+
+def origin():
+    '''the innermost project frame outside this module, as file:line in function'''
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(PROJECT_ROOT) and filename != THIS_FILE
+                and 'site-packages' not in filename):
+            return f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}'
+    return None
+
+
+class SlowQueryRecorder:
+    '''
+    Execute wrapper timing every statement of a connection
+    '''
+    def __init__(self, connection, threshold_ms, capture_plan=True):
+        self.connection = connection
+        self.threshold_ms = threshold_ms
+        self.capture_plan = capture_plan
+        self.view = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.threshold_ms and not getattr(_explaining, 'active', False):
+                self.record(sql, params, many, duration_ms)
+
+    def record(self, sql, params, many, duration_ms):
+        plan = None
+        if self.capture_plan and not many:
+            plan = explain(self.connection, sql, params)
+        log.record({'time': datetime.datetime.now(),
+                    'alias': self.connection.alias,
+                    'view': self.view,
+                    'sql': sql,
+                    'params': repr(params)[:1000],
+                    'duration_ms': round(duration_ms, 2),
+                    'origin': origin(),
+                    'plan': plan})
+
+
+class SlowQueryMiddleware:
+    '''
+    Record the slow statements of each request in the slow-query log
+    '''
+    def __init__(self, get_response):
+        config = settings.SLOW_QUERY_LOG
+        if config['THRESHOLD_MS'] is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold_ms = config['THRESHOLD_MS']
+        self.capture_plan = config['EXPLAIN']
+
+    def __call__(self, request):
+        request.slow_query_recorders = [
+            SlowQueryRecorder(connections[alias], self.threshold_ms, self.capture_plan)
+            for alias in connections]
+        with ExitStack() as stack:
+            for recorder in request.slow_query_recorders:
+                stack.enter_context(recorder.connection.execute_wrapper(recorder))
+            return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for recorder in request.slow_query_recorders:
+            recorder.view = request.resolver_match.view_name
+        return None
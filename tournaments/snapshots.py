@@ -0,0 +1,122 @@
+'''
+Frozen leaderboard snapshots for closed tournaments.
+
+Once a tournament has closed its leaderboard never changes, so its document
+is computed once and stored in a LeaderboardSnapshot row, shared by every
+web process whichever process published it: the scheduled
+advance_tournaments command, or the first highscore read of a closed
+tournament without one. A snapshot costs one query to serve instead of
+reading every score. The page is rendered per request from the stored data,
+so it keeps the navigation of the logged in player, and is cached privately
+for LEADERBOARD_SNAPSHOT_MAX_AGE seconds, then revalidated with its ETag and
+Last-Modified.
+'''
+import datetime
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from . import lifecycle, read_models
+from .models import LeaderboardSnapshot, Tournament, CLOSED, ARCHIVED
+from .writebehind import score_queue
+
+
+def leaderboard(tournament_id):
+    '''
+    context of the highscore page
+    '''
+    tour_play = read_models.scores(lifecycle.scores(tournament_id).order_by('-score'))
+    # count and average of the fetched rows, as Count and Avg would give them
+    scores = [tp.score for tp in tour_play if tp.score is not None]
+    return {'tour_play': tour_play,
+            'total_taken': len(tour_play),
+            'average': {'score__avg': sum(scores) / len(scores) if scores else None}}
+
+
+def leaderboard_json(tournament_id, context):
+    '''
+    JSON document of a leaderboard context
+    '''
+    return {'tournament': tournament_id,
+            'total_taken': context['total_taken'],
+            'average': context['average']['score__avg'],
+            'scores': [{'player': tp.player,
+                        'score': tp.score,
+                        'complete_date': tp.complete_date and tp.complete_date.isoformat()}
+                       for tp in context['tour_play']]}
+
+
+def leaderboard_context(document):
+    '''
+    context of the highscore page from a JSON document of the leaderboard
+    '''
+    return {'tour_play': [read_models.ScoreRow(
+                score['player'], score['score'],
+                score['complete_date'] and datetime.date.fromisoformat(score['complete_date']))
+                          for score in document['scores']],
+            'total_taken': document['total_taken'],
+            'average': {'score__avg': document['average']}}
+
+
+def publish(tournament_id):
+    '''
+    store the final leaderboard of a closed tournament, returns the snapshot
+    '''
+    if settings.SCORE_WRITE_BEHIND:
+        score_queue.flush(wait=True)
+    document = leaderboard_json(tournament_id, leaderboard(tournament_id))
+    snapshot, _ = LeaderboardSnapshot.objects.update_or_create(
+        tournament_id=tournament_id, defaults={'leaderboard': document})
+    return snapshot
+
+
+def publish_missing(tournament_ids=None):
+    '''
+    publish the closed tournaments, among tournament_ids when given, that
+    have no snapshot yet. Returns the tournament ids.
+    '''
+    tournaments = Tournament.objects.filter(status__in=[CLOSED, ARCHIVED],
+                                            leaderboardsnapshot__isnull=True)
+    if tournament_ids is not None:
+        tournaments = tournaments.filter(id__in=tournament_ids)
+    published = list(tournaments.values_list('id', flat=True))
+    for tournament_id in published:
+        publish(tournament_id)
+    return published
+
+
+def remove(tournament_id):
+    '''
+    delete the snapshot, e.g. when a tournament is reopened
+    '''
+    LeaderboardSnapshot.objects.filter(tournament_id=tournament_id).delete()
+
+
+def serve(request, tournament_id, extension):
+    '''
+    response from the snapshot of a closed tournament, published on the
+    first read, None for a tournament that is not closed
+    '''
+    row = Tournament.objects.filter(id=tournament_id).values_list(
+        'status', 'leaderboardsnapshot__leaderboard', 'leaderboardsnapshot__published').first()
+    if row is None or row[0] not in (CLOSED, ARCHIVED):
+        return None
+    _, document, published = row
+    if document is None:
+        snapshot = publish(tournament_id)
+        document, published = snapshot.leaderboard, snapshot.published
+    # the page carries the navigation of the user, the etag tells them apart
+    etag = quote_etag(f'{tournament_id}-{published.timestamp()}-{request.user.pk}-{extension}')
+    last_modified = int(published.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if extension == 'json':
+            response = JsonResponse(document)
+        else:
+            response = render(request, 'highscore.html',
+                              dict(leaderboard_context(document), frozen=True))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, max_age=settings.LEADERBOARD_SNAPSHOT_MAX_AGE)
+    return response
@@ -1,13 +1,48 @@
 '''Test class. This class will test the application view, models, api and end to end connection using selenium'''
+import asyncio
 import datetime
-from django.test import LiveServerTestCase, TestCase
+import hashlib
+import io
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from asgiref.sync import async_to_sync, sync_to_async
+from django.template import TemplateSyntaxError
+from django.templatetags.static import static
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
 from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from selenium import webdriver
 from selenium.webdriver.common.keys import Keys
-from .models import Tournament, TournamentPlayer, Question
+from tournament.asgi import application
+from tournament.caches import answer_buffer
+from tournament.warmup import warm_up
+from .live import PostgresBroker, broker, publish_score
+from . import autosave, lifecycle, read_models, search, slowqueries, snapshots
+from .admission import AdmissionController
+from .profiling import ProfilingMiddleware
+from .hashers import HashingPool, PooledPBKDF2PasswordHasher, acheck_password
+from .models import (Tournament, TournamentPlayer, Question, ArchivedScore, ArchivedQuestionSet,
+                     LeaderboardSnapshot)
+from .serializers import TournamentSerializer
+from .trivia import CircuitOpen, ClientError, RateLimited, TriviaClient, TriviaError
+from .writebehind import ScoreQueue
 
 class ModelTestCase(TestCase):
     '''Test case for model'''
@@ -70,6 +105,13 @@ class TournamentAPITestCase(APITestCase):
         }
         my_admin = User.objects.create_superuser('myuser', 'myemail@test.com', password)
         self.client.login(username=my_admin.username, password=password)
+        #questions come from a local fake of the trivia api
+        server = FakeTriviaServer().__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+        patcher = mock.patch('tournaments.trivia.client',
+                             TriviaClient(server.url, backoff=0, min_interval=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_create_tournament(self):
         '''create tournament using the api'''
@@ -251,6 +293,1340 @@ class ViewTestCase(TestCase):
         self.assertContains(response, "Final Score: ")
         self.assertContains(response, "Incorrect Questions")
 
+class WarmUpTestCase(TestCase):
+    '''Test case for the worker warm-up'''
+    def test_warm_up_steps(self):
+        '''every step runs and warms at least one item'''
+        timings = warm_up()
+        self.assertEqual([name for name, _, _ in timings],
+                         ['urls', 'templates', 'caches'])
+        for _, count, _ in timings:
+            self.assertGreater(count, 0)
+
+    def test_broken_template_fails_warm_up(self):
+        '''a template that does not compile fails the boot'''
+        with mock.patch('tournament.warmup.get_template',
+                        side_effect=TemplateSyntaxError('unclosed tag')):
+            with self.assertRaises(TemplateSyntaxError):
+                warm_up()
+
+class StaticStorageTestCase(TestCase):
+    '''Test case for the fingerprinted static files storage'''
+    def test_static_without_manifest(self):
+        '''without collectstatic the plain file name is used'''
+        self.assertEqual(static('js/jquery.bootstrap.modal.forms.min.js'),
+                         '/static/js/jquery.bootstrap.modal.forms.min.js')
+
+    def test_base_template_uses_minified_asset(self):
+        '''pages reference the minified script'''
+        response = self.client.get(reverse('tournament:index'))
+        self.assertContains(response, 'jquery.bootstrap.modal.forms.min.js')
+
+class WriteBehindTestCase(TestCase):
+    '''Test case for the write-behind score queue'''
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        #long interval so the background flusher never runs during a test
+        self.queue = ScoreQueue(directory.name, interval=3600)
+        self.tourny = Tournament.objects.create(name='TestTournament',
+                                                category='21',
+                                                difficulty='easy',
+                                                start_date=datetime.date.today(),
+                                                end_date=datetime.date.today())
+        self.question = Question.objects.create(tournament=self.tourny,
+                                                question='TestQuestion',
+                                                correct_answer='right',
+                                                choices1='right',
+                                                choices2='choice',
+                                                choices3='choice',
+                                                choices4='choice')
+        self.user = User.objects.create_user(username='jacob', password='top_secret')
+        TournamentPlayer.objects.create(tournament=self.tourny, player=self.user)
+
+    def test_flush_coalesces_entries(self):
+        '''only the latest entry for a player is applied'''
+        today = datetime.date.today()
+        self.queue.put(self.tourny.id, self.user.id, 3, today)
+        self.queue.put(self.tourny.id, self.user.id, 7, today)
+        self.assertEqual(TournamentPlayer.objects.get().score, 0)
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(TournamentPlayer.objects.get().score, 7)
+        self.assertEqual(TournamentPlayer.objects.get().complete_date, today)
+        self.assertEqual(self.queue.pending(), [])
+
+    def test_flush_replays_crashed_journal(self):
+        '''journals of dead processes are replayed, torn lines skipped'''
+        with open(os.path.join(self.queue.directory, 'scores-99999.log'), 'w') as journal:
+            journal.write(f'{self.tourny.id} {self.user.id} 5 2020-06-01\n')
+            journal.write(f'{self.tourny.id} {self.user.id} 9 20')
+        self.assertEqual(self.queue.flush(), 1)
+        self.assertEqual(TournamentPlayer.objects.get().score, 5)
+
+    def test_flush_applies_exact_pairs(self):
+        '''only the queued (tournament, player) rows are read and updated'''
+        today = datetime.date.today()
+        other_tourny = Tournament.objects.create(name='Other', category='21', difficulty='easy',
+                                                 start_date=today, end_date=today)
+        other_user = User.objects.create_user(username='ben', password='top_secret')
+        TournamentPlayer.objects.create(tournament=self.tourny, player=other_user)
+        TournamentPlayer.objects.create(tournament=other_tourny, player=self.user)
+        TournamentPlayer.objects.create(tournament=other_tourny, player=other_user)
+        self.queue.put(self.tourny.id, self.user.id, 4, today)
+        self.queue.put(other_tourny.id, other_user.id, 6, today)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.queue.flush(), 2)
+        self.assertEqual(sorted(TournamentPlayer.objects.values_list(
+            'tournament_id', 'player_id', 'score')), sorted([
+                (self.tourny.id, self.user.id, 4), (self.tourny.id, other_user.id, 0),
+                (other_tourny.id, self.user.id, 0), (other_tourny.id, other_user.id, 6)]))
+        # completions are counted by the results view, not again by the flush
+        self.assertEqual(Tournament.objects.get(id=other_tourny.id).completion_count, 0)
+        select = next(query['sql'] for query in context.captured_queries
+                      if query['sql'].startswith('SELECT'))
+        self.assertNotIn(' IN (', select)
+
+    def test_waiting_flush_blocks_on_a_running_flush(self):
+        '''a read path flush waits for the journal another flusher holds'''
+        import fcntl
+        self.queue.put(self.tourny.id, self.user.id, 3, datetime.date.today())
+        path = self.queue.pending()[0]
+        with open(path, 'r+') as journal:
+            fcntl.flock(journal, fcntl.LOCK_EX)
+            self.assertEqual(self.queue.flush(), 0)
+            done = threading.Event()
+            results = []
+
+            def flush():
+                results.append(self.queue.flush(wait=True))
+                done.set()
+            thread = threading.Thread(target=flush)
+            with mock.patch.object(self.queue, '_apply', return_value=1):
+                thread.start()
+                self.assertFalse(done.wait(0.2))
+                fcntl.flock(journal, fcntl.LOCK_UN)
+                thread.join(5)
+        self.assertEqual(results, [1])
+
+    @override_settings(SCORE_WRITE_BEHIND=True)
+    def test_results_queue_and_highscore_flush(self):
+        '''
+        results only queues the score and completes the row, so the quiz
+        cannot be taken again nor its score replaced before the flush;
+        highscore shows the score once the timed flush applied it
+        '''
+        self.client.login(username='jacob', password='top_secret')
+        url = reverse('tournament:results', kwargs={'tournament_id': self.tourny.id})
+        with mock.patch('tournaments.views.score_queue', self.queue):
+            response = self.client.post(url, data={self.question.id: 'right'})
+            self.assertContains(response, 'Final Score: 1')
+            self.assertEqual(TournamentPlayer.objects.get().score, 0)
+            self.assertEqual(TournamentPlayer.objects.get().complete_date,
+                             datetime.date.today())
+            self.assertTemplateUsed(self.client.get(reverse(
+                'tournament:start_tournament', kwargs={'tournament_id': self.tourny.id})),
+                                    'players.html')
+            response = self.client.post(url, data={self.question.id: 'wrong'})
+            self.assertContains(response, 'Final Score: 0')
+            with open(self.queue.pending()[0]) as journal:
+                self.assertEqual(len(journal.readlines()), 1)
+            highscore = reverse('tournament:highscore', kwargs={'tournament_id': self.tourny.id})
+            with self.assertNumQueries(5):  # no flush on the read path
+                self.client.get(highscore)
+            self.assertEqual(TournamentPlayer.objects.get().score, 0)
+            self.queue.flush()
+            response = self.client.get(highscore)
+        self.assertEqual([row.score for row in response.context['tour_play']], [1])
+        self.assertEqual(Tournament.objects.get(id=self.tourny.id).completion_count, 1)
+
+class LiveLeaderboardTestCase(TransactionTestCase):
+    '''
+    Test case for the server-sent events leaderboard stream. Streams query
+    the database from other threads, which must see the committed rows.
+    '''
+    def setUp(self):
+        self.tourny = Tournament.objects.create(name='TestTournament',
+                                                category='21',
+                                                difficulty='easy',
+                                                start_date=datetime.date.today(),
+                                                end_date=datetime.date.today())
+        self.user = User.objects.create_user(username='jacob', password='top_secret')
+        self.other = User.objects.create_user(username='ben', password='top_secret')
+        TournamentPlayer.objects.create(tournament=self.tourny, player=self.other,
+                                        score=8, complete_date=datetime.date.today())
+
+    def stream(self, cookie, publish=None):
+        '''run the ASGI stream until the first event, returns the messages sent'''
+        scope = {'type': 'http', 'method': 'GET', 'query_string': b'',
+                 'path': f'/tournaments/{self.tourny.id}/highscore/stream',
+                 'headers': [(b'cookie', cookie.encode())] if cookie else []}
+        messages = []
+
+        async def run():
+            inbox = asyncio.Queue()
+            await inbox.put({'type': 'http.request', 'body': b'', 'more_body': False})
+
+            async def send(message):
+                messages.append(message)
+                if b'event: score' in message.get('body', b''):
+                    await inbox.put({'type': 'http.disconnect'})
+            task = asyncio.ensure_future(application(scope, inbox.get, send))
+            if publish:
+                while not broker.has_subscribers(self.tourny.id) and not task.done():
+                    await asyncio.sleep(0.01)
+                await sync_to_async(publish)()
+            await asyncio.wait_for(task, 5)
+        async_to_sync(run)()
+        return messages
+
+    def test_stream_requires_login(self):
+        '''anonymous streams are refused'''
+        messages = self.stream(None)
+        self.assertEqual(messages[0]['status'], 403)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_stream_pushes_scores(self):
+        '''a published score reaches the open stream, ranked by the streaming process'''
+        self.client.login(username='jacob', password='top_secret')
+        cookie = 'sessionid=' + self.client.cookies['sessionid'].value
+        messages = self.stream(cookie, lambda: publish_score(self.tourny.id, self.user, 5))
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), messages[0]['headers'])
+        self.assertEqual(messages[-1]['body'],
+                         b'event: score\ndata: {"player": "jacob", "score": 5, "rank": 2}\n\n')
+        self.assertFalse(broker.has_subscribers(self.tourny.id))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_stream_refuses_invalidated_session(self):
+        '''a session from before a password change does not stream'''
+        self.client.login(username='jacob', password='top_secret')
+        cookie = 'sessionid=' + self.client.cookies['sessionid'].value
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.stream(cookie)[0]['status'], 403)
+
+    def test_publish_without_subscribers(self):
+        '''nothing is queried when nobody watches'''
+        with self.assertNumQueries(0):
+            publish_score(self.tourny.id, self.user, 5)
+
+    def test_postgres_broker(self):
+        '''
+        events go out with NOTIFY, without a rank; notifications reach the
+        local streams ranked
+        '''
+        postgres = PostgresBroker()
+        cursor = mock.MagicMock()
+        event = {'player': 'jacob', 'player_id': self.user.id, 'score': 5}
+        with mock.patch('tournaments.live.connections') as connections, \
+                mock.patch('tournaments.live.broker', postgres), self.assertNumQueries(0):
+            connections.__getitem__.return_value.cursor.return_value.__enter__.return_value = cursor
+            publish_score(self.tourny.id, self.user, 5)
+        cursor.execute.assert_called_once_with(
+            'SELECT pg_notify(%s, %s)',
+            ['leaderboard', json.dumps({'tournament': self.tourny.id, 'event': event})])
+
+        async def receive():
+            with mock.patch.object(postgres, '_listen') as listen:
+                queue = postgres.subscribe(self.tourny.id)
+            listen.assert_called_once_with()
+            await sync_to_async(postgres.deliver)(json.dumps({'tournament': self.tourny.id,
+                                                              'event': event}))
+            return await asyncio.wait_for(queue.get(), 5)
+        self.assertEqual(async_to_sync(receive)(), {'player': 'jacob', 'score': 5, 'rank': 2})
+
+    def test_asgi_serves_django_and_lifespan(self):
+        '''requests other than streams reach Django, lifespan is acknowledged'''
+        messages = []
+
+        async def run(scope, inbox):
+            queue = asyncio.Queue()
+            for message in inbox:
+                await queue.put(message)
+
+            async def send(message):
+                messages.append(message)
+            await asyncio.wait_for(application(scope, queue.get, send), 5)
+        async_to_sync(run)({'type': 'lifespan'}, [{'type': 'lifespan.startup'},
+                                                   {'type': 'lifespan.shutdown'}])
+        self.assertEqual([message['type'] for message in messages],
+                         ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+        messages.clear()
+        async_to_sync(run)({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'',
+                            'http_version': '1.1', 'headers': [(b'host', b'127.0.0.1')]},
+                           [{'type': 'http.request', 'body': b''}])
+        self.assertEqual(messages[0]['status'], 200)
+
+class TournamentReadAPITestCase(APITestCase):
+    '''Test case for the read path of the tournament api'''
+    def setUp(self):
+        self.tourny = Tournament.objects.create(name='TestTournament',
+                                                category='21',
+                                                difficulty='easy',
+                                                start_date=datetime.date(2020, 6, 2),
+                                                end_date=datetime.date(2020, 6, 26))
+        Question.objects.create(tournament=self.tourny,
+                                question='TestQuestion',
+                                correct_answer='right',
+                                choices1='right',
+                                choices2='choice',
+                                choices3='choice',
+                                choices4='choice')
+        User.objects.create_superuser('myuser', 'myemail@test.com', 'mypassword')
+        self.client.login(username='myuser', password='mypassword')
+
+    def test_list_matches_model_serializer(self):
+        '''the read path returns what TournamentSerializer returned'''
+        response = self.client.get('/tournaments_api/', format='json')
+        self.assertEqual(response.json(),
+                         [dict(TournamentSerializer(self.tourny).data)])
+
+    def test_detail(self):
+        '''detail through the read path, unknown ids are not found'''
+        url = reverse('tournament:edit_tournament', kwargs={'pk': self.tourny.pk})
+        response = self.client.get(url, format='json')
+        self.assertEqual(response.json()['name'], 'TestTournament')
+        url = reverse('tournament:edit_tournament', kwargs={'pk': 999})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expand_questions(self):
+        '''questions are loaded with a single extra query'''
+        url = reverse('tournament:create_tournament') + '?expand=questions'
+        self.client.get(url)  # warm the session and user lookups
+        with self.assertNumQueries(4):  # session, user, tournaments, questions
+            response = self.client.get(url)
+        self.assertEqual(response.json()[0]['questions'][0]['choices'],
+                         ['right', 'choice', 'choice', 'choice'])
+
+class QuizAPITestCase(APITestCase):
+    '''Test case for the mobile quiz api'''
+    def setUp(self):
+        self.tournaments = [Tournament.objects.create(name=f'TestTournament{i}',
+                                                      category='21',
+                                                      difficulty='easy',
+                                                      start_date=datetime.date.today(),
+                                                      end_date=datetime.date.today())
+                            for i in range(2)]
+        self.questions = [Question.objects.create(tournament=tournament,
+                                                  question='TestQuestion',
+                                                  correct_answer='right',
+                                                  choices1='wrong',
+                                                  choices2='right',
+                                                  choices3='choice',
+                                                  choices4='choice')
+                          for tournament in self.tournaments]
+        self.user = User.objects.create_user(username='jacob', password='top_secret')
+        self.client.login(username='jacob', password='top_secret')
+
+    def test_questions_without_answers(self):
+        '''questions come with a choices array and no correct answer'''
+        url = reverse('tournament:quiz_questions',
+                      kwargs={'tournament_id': self.tournaments[0].id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['questions'],
+                         [{'id': self.questions[0].id, 'question': 'TestQuestion',
+                           'choices': ['wrong', 'right', 'choice', 'choice']}])
+        self.assertNotIn('correct_answer', response.content.decode())
+
+    def test_questions_unknown_tournament(self):
+        '''unknown tournaments are not found'''
+        response = self.client.get(reverse('tournament:quiz_questions',
+                                           kwargs={'tournament_id': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_answers_graded_once(self):
+        '''a submission is graded and saved, a second one is refused'''
+        url = reverse('tournament:quiz_answers', kwargs={'tournament_id': self.tournaments[0].id})
+        data = {'answers': {str(self.questions[0].id): 'right'}}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.json(), {'tournament': self.tournaments[0].id,
+                                           'score': 1, 'total': 1, 'incorrect': {}})
+        self.assertEqual(TournamentPlayer.objects.get(player=self.user).score, 1)
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_answers_body_must_be_an_object(self):
+        '''list and scalar bodies are rejected, not a server error'''
+        for name in ('quiz_answers', 'quiz_autosave'):
+            url = reverse(f'tournament:{name}', kwargs={'tournament_id': self.tournaments[0].id})
+            for body in ([1, 2], 'answers', 3):
+                with self.subTest(name, body=body):
+                    response = self.client.post(url, body, format='json')
+                    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_submissions(self):
+        '''offline submissions of several tournaments are graded together'''
+        TournamentPlayer.objects.create(tournament=self.tournaments[1], player=self.user)
+        data = [{'tournament': self.tournaments[0].id,
+                 'answers': {str(self.questions[0].id): 'right'}},
+                {'tournament': self.tournaments[1].id,
+                 'answers': {str(self.questions[1].id): 'wrong'}},
+                {'tournament': 999, 'answers': {}}]
+        response = self.client.post(reverse('tournament:quiz_submissions'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()
+        self.assertEqual(results[0]['score'], 1)
+        self.assertEqual(results[1]['incorrect'], {str(self.questions[1].id): 'right'})
+        self.assertEqual(results[2], {'tournament': 999, 'error': 'not found'})
+        scores = TournamentPlayer.objects.filter(player=self.user).order_by('tournament_id')
+        self.assertEqual([tour_play.score for tour_play in scores], [1, 0])
+        self.assertTrue(all(tour_play.complete_date for tour_play in scores))
+
+    def test_batch_requires_login(self):
+        '''anonymous submissions are refused'''
+        self.client.logout()
+        response = self.client.post(reverse('tournament:quiz_submissions'), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class LifecycleTestCase(TestCase):
+    '''Test case for tournament statuses and archival'''
+    def setUp(self):
+        today = datetime.date.today()
+        self.past = Tournament.objects.create(name='TestTournamentPast',
+                                              category='21',
+                                              difficulty='easy',
+                                              start_date=datetime.datetime(1990, 5, 17),
+                                              end_date=datetime.datetime(1990, 5, 20))
+        self.future = Tournament.objects.create(name='TestTournamentFuture',
+                                                category='21',
+                                                difficulty='easy',
+                                                start_date=today + datetime.timedelta(days=1),
+                                                end_date=today + datetime.timedelta(days=2))
+        Question.objects.create(tournament=self.past,
+                                question='TestQuestion',
+                                correct_answer='right',
+                                choices1='right',
+                                choices2='choice',
+                                choices3='choice',
+                                choices4='choice')
+        self.user = User.objects.create_superuser('myuser', 'myemail@test.com', 'mypassword')
+        TournamentPlayer.objects.create(tournament=self.past, player=self.user,
+                                        score=7, complete_date=datetime.date(1990, 5, 18))
+
+    def test_status_from_dates(self):
+        '''save derives the status from the dates'''
+        self.assertEqual(self.past.status, 'closed')
+        self.assertEqual(self.future.status, 'upcoming')
+
+    def test_advance(self):
+        '''tournaments move on at their date boundaries'''
+        Tournament.objects.update(status='upcoming')
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        self.assertEqual(lifecycle.advance(tomorrow), [self.past.id])
+        self.assertEqual(Tournament.objects.get(id=self.past.id).status, 'closed')
+        self.assertEqual(Tournament.objects.get(id=self.future.id).status, 'ongoing')
+
+    def test_archive_keeps_highscores_readable(self):
+        '''archived rows leave the hot tables and are still shown'''
+        call_command('advance_tournaments', stdout=io.StringIO())
+        self.assertEqual(Tournament.objects.get(id=self.past.id).status, 'archived')
+        self.assertFalse(TournamentPlayer.objects.exists())
+        self.assertFalse(Question.objects.exists())
+        self.assertEqual(ArchivedScore.objects.get().score, 7)
+        self.client.login(username='myuser', password='mypassword')
+        response = self.client.get(reverse('tournament:highscore',
+                                           kwargs={'tournament_id': self.past.id}))
+        self.assertContains(response, 'myuser')
+        response = self.client.get(reverse('tournament:tournament_question',
+                                           kwargs={'tournament_id': self.past.id}))
+        self.assertContains(response, 'TestQuestion')
+        response = self.client.get(reverse('tournament:list_past_tournament'))
+        self.assertContains(response, 'TestTournamentPast')
+
+    def test_archived_tournament_cannot_be_reentered(self):
+        '''
+        archived tournaments refuse new players, and submissions are gone
+        rather than graded against no questions
+        '''
+        call_command('advance_tournaments', stdout=io.StringIO())
+        self.client.login(username='myuser', password='mypassword')
+        kwargs = {'tournament_id': self.past.id}
+        response = self.client.get(reverse('tournament:start_tournament', kwargs=kwargs))
+        self.assertContains(response, 'This tournament is closed')
+        response = self.client.post(reverse('tournament:results', kwargs=kwargs),
+                                    {str(Question.objects.count() + 1): 'right'})
+        self.assertContains(response, 'This tournament is archived', status_code=410)
+        self.assertNotContains(response, 'Final Score', status_code=410)
+        for name in ('quiz_answers', 'quiz_autosave'):
+            response = self.client.post(reverse(f'tournament:{name}', kwargs=kwargs),
+                                        {'answers': {'1': 'right'}},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 410, name)
+        response = self.client.get(reverse('tournament:quiz_questions', kwargs=kwargs))
+        self.assertEqual(response.status_code, 410)
+        self.assertFalse(TournamentPlayer.objects.exists())
+        response = self.client.get(reverse('tournament:start_tournament',
+                                           kwargs={'tournament_id': 999}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_archive_queries_do_not_grow_with_tournaments(self):
+        '''tournaments are archived together, not one by one'''
+        with CaptureQueriesContext(connection) as one:
+            lifecycle.archive([self.past.id])
+        others = [Tournament.objects.create(name=f'Past {i}', category='21', difficulty='easy',
+                                            start_date=datetime.date(1990, 5, 17),
+                                            end_date=datetime.date(1990, 5, 20))
+                  for i in range(3)]
+        for tournament in others:
+            TournamentPlayer.objects.create(tournament=tournament, player=self.user, score=3)
+            Question.objects.create(tournament=tournament, question='Other', correct_answer='a',
+                                    choices1='a', choices2='b', choices3='c', choices4='d')
+        with CaptureQueriesContext(connection) as many:
+            lifecycle.archive([tournament.id for tournament in others])
+        self.assertEqual(len(one), len(many))
+        self.assertEqual(ArchivedScore.objects.count(), 4)
+        self.assertEqual([question_set.questions[0]['question'] for question_set in
+                          ArchivedQuestionSet.objects.filter(tournament__in=others)],
+                         ['Other'] * 3)
+        self.assertFalse(Question.objects.exists())
+
+    def test_archive_waits_for_retention(self):
+        '''recently closed tournaments stay in the hot tables'''
+        self.assertEqual(lifecycle.archivable(datetime.date(1990, 5, 25), retention_days=30), [])
+
+class SnapshotTestCase(TestCase):
+    '''Test case for frozen leaderboard snapshots'''
+    setUp = LifecycleTestCase.setUp
+
+    def test_snapshot_served_from_one_query(self):
+        '''published leaderboards are read from their snapshot, with the user's navigation'''
+        snapshots.publish(self.past.id)
+        ArchivedScore.objects.all().delete()
+        TournamentPlayer.objects.all().delete()
+        url = reverse('tournament:highscore', kwargs={'tournament_id': self.past.id})
+        self.client.login(username='myuser', password='mypassword')
+        self.client.get(reverse('tournament:index'))  # warm the session and user lookups
+        with self.assertNumQueries(3):  # session, user and snapshot
+            response = self.client.get(url)
+        self.assertContains(response, 'myuser')
+        self.assertContains(response, 'View Tournaments')
+        self.assertNotContains(response, 'Sign Up')
+        self.assertNotContains(response, 'EventSource')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+        response = self.client.get(url + '.json')
+        self.assertEqual(response.json()['scores'], [{'player': 'myuser', 'score': 7,
+                                                      'complete_date': '1990-05-18'}])
+
+    def test_snapshot_requires_login_and_revalidates(self):
+        '''snapshots are not served anonymously, unchanged ones answer 304'''
+        snapshots.publish(self.past.id)
+        url = reverse('tournament:highscore', kwargs={'tournament_id': self.past.id})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.login(username='myuser', password='mypassword')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        snapshots.publish(self.past.id)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_first_read_publishes(self):
+        '''a closed tournament without a snapshot gets one on its first read'''
+        self.client.login(username='myuser', password='mypassword')
+        url = reverse('tournament:highscore', kwargs={'tournament_id': self.past.id})
+        self.assertEqual(self.client.get(url + '.json').json()['total_taken'], 1)
+        self.assertTrue(LeaderboardSnapshot.objects.filter(tournament=self.past).exists())
+
+    def test_live_json_for_open_tournament(self):
+        '''open tournaments are read live and get no snapshot'''
+        TournamentPlayer.objects.create(tournament=self.future, player=self.user, score=3)
+        self.client.login(username='myuser', password='mypassword')
+        url = reverse('tournament:highscore', kwargs={'tournament_id': self.future.id})
+        self.assertEqual(self.client.get(url + '.json').json()['total_taken'], 1)
+        self.assertFalse(LeaderboardSnapshot.objects.exists())
+
+    def test_lifecycle_publishes_and_update_removes(self):
+        '''closing publishes the snapshot, editing the tournament drops it'''
+        call_command('advance_tournaments', stdout=io.StringIO())
+        self.assertTrue(LeaderboardSnapshot.objects.filter(tournament=self.past).exists())
+        self.client.login(username='myuser', password='mypassword')
+        self.client.put(reverse('tournament:edit_tournament', kwargs={'pk': self.past.id}),
+                        {'name': 'Reopened', 'category': '21', 'difficulty': 'easy',
+                         'start_date': '1990-05-17', 'end_date': '2100-05-20'},
+                        content_type='application/json')
+        self.assertFalse(LeaderboardSnapshot.objects.filter(tournament=self.past).exists())
+
+    def test_late_submission_leaves_the_snapshot_final(self):
+        '''a player who started before the close cannot change the published leaderboard'''
+        snapshot = snapshots.publish(self.past.id)
+        late = User.objects.create_user(username='late', password='top_secret')
+        TournamentPlayer.objects.create(tournament=self.past, player=late)
+        self.client.force_login(late)
+        kwargs = {'tournament_id': self.past.id}
+        question_id = str(Question.objects.get().id)
+        response = self.client.post(reverse('tournament:results', kwargs=kwargs),
+                                    {question_id: 'right'})
+        self.assertContains(response, 'This tournament is closed', status_code=409)
+        response = self.client.post(reverse('tournament:quiz_answers', kwargs=kwargs),
+                                    {'answers': {question_id: 'right'}},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['error'], 'closed')
+        self.assertIsNone(TournamentPlayer.objects.get(player=late).complete_date)
+        self.assertEqual(LeaderboardSnapshot.objects.get().published, snapshot.published)
+
+    def test_admin_edit_removes(self):
+        '''editing a tournament in the admin drops its snapshot too'''
+        snapshots.publish(self.past.id)
+        self.client.login(username='myuser', password='mypassword')
+        response = self.client.post(
+            reverse('admin:tournaments_tournament_change', args=[self.past.id]),
+            {'name': 'Reopened', 'category': '21', 'difficulty': 'easy',
+             'start_date': '1990-05-17', 'end_date': '2100-05-20', 'status': 'closed'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Tournament.objects.get(id=self.past.id).status, 'ongoing')
+        self.assertFalse(LeaderboardSnapshot.objects.exists())
+
+class AdmissionControlTestCase(TestCase):
+    '''Test case for admission control and load shedding'''
+    def wait_for(self, condition, timeout=5):
+        '''poll until condition() holds, the controller does not signal waiters'''
+        deadline = time.monotonic() + timeout
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, 'condition not met in time')
+            time.sleep(0.01)
+
+    def test_endpoint_limit(self):
+        '''an endpoint cannot use more than its limit'''
+        controller = AdmissionController(capacity=4, queue_size=0)
+        self.assertTrue(controller.acquire('start_tournament', 1, 0, timeout=0))
+        self.assertFalse(controller.acquire('start_tournament', 1, 0, timeout=0))
+        self.assertTrue(controller.acquire('results', 1, 10, timeout=0))
+        self.assertEqual(controller.stats()['shed'], {'start_tournament': 1})
+
+    def test_waiter_gets_released_slot(self):
+        '''a queued request runs as soon as a slot is released'''
+        controller = AdmissionController(capacity=1, queue_size=1)
+        controller.acquire('results', 1, 10, timeout=0)
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(
+            controller.acquire('results', 1, 10, timeout=5)))
+        waiter.start()
+        self.wait_for(lambda: controller.stats()['queue_depth'] == 1)
+        controller.release('results')
+        waiter.join()
+        self.assertEqual(admitted, [True])
+
+    def test_low_priority_shed_first(self):
+        '''a full queue sheds the lower priority waiter for a results submission'''
+        controller = AdmissionController(capacity=1, queue_size=1)
+        controller.acquire('results', 1, 10, timeout=0)
+        outcome = {}
+        start = threading.Thread(target=lambda: outcome.setdefault(
+            'start', controller.acquire('start_tournament', 1, 0, timeout=5)))
+        start.start()
+        self.wait_for(lambda: controller.stats()['queue_depth'] == 1)
+        # the queue is full, another start request is shed at once
+        self.assertFalse(controller.acquire('start_tournament', 1, 0, timeout=5))
+        results = threading.Thread(target=lambda: outcome.setdefault(
+            'results', controller.acquire('results', 1, 10, timeout=5)))
+        results.start()
+        start.join()
+        controller.release('results')
+        results.join()
+        self.assertEqual(outcome, {'start': False, 'results': True})
+        self.assertEqual(controller.stats()['shed'], {'start_tournament': 2})
+
+    def test_reserved_threads_stay_free(self):
+        '''a burst of gated requests on every worker thread leaves the reserved threads free'''
+        config = settings.ADMISSION_CONTROL
+        controller = AdmissionController(config['CAPACITY'], config['QUEUE_SIZE'])
+        endpoint = config['ENDPOINTS']['results']
+        outcome = []
+        burst = [threading.Thread(target=lambda: outcome.append(controller.acquire(
+                    'results', endpoint['LIMIT'], endpoint['PRIORITY'], timeout=5)))
+                 for _ in range(settings.WORKER_THREADS)]
+        for thread in burst:
+            thread.start()
+        shed = settings.WORKER_THREADS - config['CAPACITY'] - config['QUEUE_SIZE']
+        self.wait_for(lambda: controller.stats()['shed'].get('results') == shed)
+        stats = controller.stats()
+        self.assertEqual(stats['running'], config['CAPACITY'])
+        self.assertEqual(stats['queue_depth'], config['QUEUE_SIZE'])
+        self.assertGreaterEqual(shed, config['RESERVED_THREADS'])
+        for _ in range(config['CAPACITY'] + config['QUEUE_SIZE']):
+            controller.release('results')
+        for thread in burst:
+            thread.join()
+        self.assertEqual(outcome.count(False), shed)
+        self.assertEqual(controller.stats()['running'], 0)
+
+    def test_shed_response(self):
+        '''shed requests get a 503 with Retry-After, other pages are unaffected'''
+        config = dict(settings.ADMISSION_CONTROL, CAPACITY=0, QUEUE_SIZE=0)
+        User.objects.create_superuser('myuser', 'myemail@test.com', 'mypassword')
+        self.client.login(username='myuser', password='mypassword')
+        with self.settings(ADMISSION_CONTROL=config):
+            response = self.client.get(reverse('tournament:start_tournament',
+                                               kwargs={'tournament_id': 1}))
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '5')
+            self.assertEqual(self.client.get(reverse('tournament:index')).status_code, 200)
+            stats = self.client.get(reverse('tournament:admission_stats')).json()
+        self.assertEqual(stats['shed'], {'start_tournament': 1})
+
+class PooledHasherTestCase(TestCase):
+    '''Test case for password hashing in the process pool'''
+    def test_compatible_with_default_hasher(self):
+        '''hashes are identical to the ones of the default pbkdf2 hasher'''
+        pooled = PooledPBKDF2PasswordHasher().encode('top_secret', 'salt', 1000)
+        self.assertEqual(pooled, PBKDF2PasswordHasher().encode('top_secret', 'salt', 1000))
+        self.assertTrue(PooledPBKDF2PasswordHasher().verify('top_secret', pooled))
+        self.assertFalse(PooledPBKDF2PasswordHasher().verify('wrong', pooled))
+
+    def test_login_and_async_check(self):
+        '''users log in with pooled hashes, async views can check passwords'''
+        user = User.objects.create_user(username='jacob', password='top_secret')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.client.login(username='jacob', password='top_secret'))
+        self.assertTrue(async_to_sync(acheck_password)('top_secret', user.password))
+
+    def test_killed_pool_process_replaced(self):
+        '''a pool whose process was killed is replaced instead of failing every login'''
+        pool = HashingPool(workers=1, niceness=0)
+        expected = hashlib.pbkdf2_hmac('sha256', b'top_secret', b'salt', 1000)
+        self.assertEqual(pool.pbkdf2('sha256', b'top_secret', b'salt', 1000), expected)
+        executor = pool.executor()
+        self.addCleanup(lambda: pool.executor().shutdown())
+        process = next(iter(executor._processes.values()))
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+        self.assertEqual(pool.pbkdf2('sha256', b'top_secret', b'salt', 1000), expected)
+        self.assertIsNot(pool.executor(), executor)
+
+class AutosaveTestCase(TestCase):
+    '''Test case for the in-progress answer buffer, in the configured cache'''
+    def setUp(self):
+        self.addCleanup(caches[settings.ANSWER_BUFFER_CACHE].clear)
+        self.tournament = Tournament.objects.create(name='Autosave', category='21',
+                                                    difficulty='easy',
+                                                    start_date=datetime.date.today(),
+                                                    end_date=datetime.date.today())
+        self.questions = [Question.objects.create(tournament=self.tournament,
+                                                  question=f'Question {i}', correct_answer='right',
+                                                  choices1='right', choices2='wrong',
+                                                  choices3='other', choices4='none')
+                          for i in range(2)]
+        self.user = User.objects.create_user(username='jacob', password='top_secret')
+        self.client.force_login(self.user)
+        self.autosave_url = reverse('tournament:quiz_autosave',
+                                    kwargs={'tournament_id': self.tournament.id})
+
+    def autosave(self, answers):
+        return self.client.post(self.autosave_url, {'answers': answers},
+                                content_type='application/json')
+
+    def test_resume_and_grade_from_buffer(self):
+        '''a dropped quiz resumes with its answers and the buffer is graded'''
+        start_url = reverse('tournament:start_tournament',
+                            kwargs={'tournament_id': self.tournament.id})
+        self.client.get(start_url)
+        with self.assertNumQueries(2):  # session and user, the buffer is not in the database
+            response = self.autosave({str(self.questions[0].id): 'right'})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.autosave({str(self.questions[1].id): 'wrong'})
+        response = self.client.get(start_url)
+        self.assertTemplateUsed(response, 'question.html')
+        self.assertContains(response, "value='right' checked", count=1)
+        self.assertContains(response, "value='wrong' checked", count=1)
+        # the form overrides the buffer for the questions it answers
+        response = self.client.post(reverse('tournament:results',
+                                            kwargs={'tournament_id': self.tournament.id}),
+                                    {str(self.questions[1].id): 'right'})
+        self.assertEqual(response.context['correct_count'], 2)
+        self.assertEqual(TournamentPlayer.objects.get(player=self.user).score, 2)
+        self.assertTemplateUsed(self.client.get(start_url), 'players.html')
+        self.assertEqual(autosave.load(self.tournament.id, self.user.id,
+                                       [question.id for question in self.questions]), {})
+
+    def test_invalid_autosave(self):
+        '''only answers keyed by question id are buffered'''
+        self.assertEqual(self.autosave({'csrf': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.autosave('right').status_code, status.HTTP_400_BAD_REQUEST)
+        question_id = str(self.questions[0].id)
+        # only once the quiz is started
+        self.assertEqual(self.autosave({question_id: 'right'}).status_code,
+                         status.HTTP_409_CONFLICT)
+        response = self.client.post(reverse('tournament:quiz_autosave',
+                                            kwargs={'tournament_id': 999}),
+                                    {'answers': {question_id: 'right'}},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        tour_play = TournamentPlayer.objects.create(tournament=self.tournament, player=self.user)
+        # a quiz started before the buffer expired is checked in the database
+        with self.assertNumQueries(4):  # session, user, participation and questions
+            self.assertEqual(self.autosave({question_id: 'right'}).status_code,
+                             status.HTTP_204_NO_CONTENT)
+        # only questions of the tournament, only answers of a choice's length
+        other = Question.objects.create(tournament=Tournament.objects.create(
+            name='Other', category='21', difficulty='easy', start_date=datetime.date.today(),
+            end_date=datetime.date.today()), question='Other', correct_answer='right',
+                                        choices1='right', choices2='wrong', choices3='other',
+                                        choices4='none')
+        self.assertEqual(self.autosave({str(other.id): 'right'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.autosave({question_id: 'x' * 501}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.autosave({question_id: 'right'}).status_code,
+                         status.HTTP_204_NO_CONTENT)
+        # and not once it is completed
+        tour_play.complete_date = datetime.date.today()
+        tour_play.save()
+        autosave.clear(self.tournament.id, self.user.id, [question_id])  # as the results view does
+        self.assertEqual(self.autosave({question_id: 'right'}).status_code,
+                         status.HTTP_409_CONFLICT)
+        self.client.logout()
+        self.assertEqual(self.autosave({'1': 'right'}).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_buffer_configuration(self):
+        '''the buffer is memcached when the add-on is attached, never the database'''
+        self.assertNotIn('.db.', settings.CACHES[settings.ANSWER_BUFFER_CACHE]['BACKEND'])
+        config = answer_buffer({'MEMCACHIER_SERVERS': 'mc1:11211,mc2:11211',
+                                'MEMCACHIER_USERNAME': 'user', 'MEMCACHIER_PASSWORD': 'secret'})
+        self.assertEqual(config['BACKEND'],
+                         'django.core.cache.backends.memcached.PyLibMCCache')
+        self.assertEqual(config['LOCATION'], ['mc1:11211', 'mc2:11211'])
+        self.assertEqual((config['OPTIONS']['username'], config['OPTIONS']['password']),
+                         ('user', 'secret'))
+
+class ReadModelTestCase(TestCase):
+    '''Test case for the slim read models'''
+    def test_rows(self):
+        '''rows carry the template attributes and nothing else'''
+        tournament = Tournament.objects.create(name='Rows', category='22', difficulty='hard',
+                                               start_date=datetime.date.today(),
+                                               end_date=datetime.date.today())
+        user = User.objects.create(username='jacob')
+        TournamentPlayer.objects.create(tournament=tournament, player=user, score=7)
+        row = read_models.tournaments(Tournament.objects.all())[0]
+        self.assertEqual((row.get_category_display(), row.get_difficulty_display()),
+                         ('Geography', 'Hard'))
+        self.assertFalse(hasattr(row, '__dict__'))
+        score = read_models.scores(TournamentPlayer.objects.all())[0]
+        self.assertEqual((score.player, score.score), ('jacob', 7))
+        question = {'id': 1, 'question': 'Q', 'correct_answer': 'a',
+                    'choices1': 'a', 'choices2': 'b', 'choices3': 'c', 'choices4': 'd'}
+        self.assertEqual(read_models.questions([question])[0].choices4, 'd')
+
+class AdminTestCase(TestCase):
+    '''Test case for the scale-aware admin'''
+    def setUp(self):
+        today = datetime.date.today()
+        self.tournaments = [Tournament.objects.create(name=f'Admin {i}', category='21',
+                                                      difficulty='easy', start_date=today,
+                                                      end_date=today + datetime.timedelta(days=7))
+                            for i in range(2)]
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'top_secret')
+        self.client.force_login(self.admin)
+
+    def add_players(self, count):
+        for tournament in self.tournaments:
+            for _ in range(count):
+                player = User.objects.create(username=f'player{User.objects.count()}')
+                TournamentPlayer.objects.create(tournament=tournament, player=player)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        '''related rows are joined, not loaded per row'''
+        url = reverse('admin:tournaments_tournamentplayer_changelist')
+        self.add_players(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_players(10)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(few), len(many))
+        for name in ('tournament', 'question'):
+            self.assertEqual(self.client.get(
+                reverse(f'admin:tournaments_{name}_changelist')).status_code, 200)
+
+    def test_tournament_shown_by_name(self):
+        '''questions list their tournament by name'''
+        Question.objects.create(tournament=self.tournaments[0], question='Named',
+                                correct_answer='a', choices1='a', choices2='b',
+                                choices3='c', choices4='d')
+        response = self.client.get(reverse('admin:tournaments_question_changelist'))
+        self.assertContains(response, '<td class="field-tournament nowrap">Admin 0</td>', html=True)
+
+    def run_action(self, action, tournaments):
+        return self.client.post(reverse('admin:tournaments_tournament_changelist'),
+                                {'action': action,
+                                 '_selected_action': [tournament.id for tournament in tournaments]},
+                                follow=True)
+
+    def test_close_and_archive(self):
+        '''
+        closing keeps the dates and publishes only the selected leaderboards,
+        archiving moves the rows
+        '''
+        self.add_players(1)
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        elsewhere = Tournament.objects.create(name='Elsewhere', category='21', difficulty='easy',
+                                              start_date=yesterday, end_date=yesterday)
+        self.run_action('close_tournaments', self.tournaments[:1])
+        closed = Tournament.objects.get(id=self.tournaments[0].id)
+        self.assertEqual(closed.status, 'closed')
+        self.assertEqual(closed.end_date, self.tournaments[0].end_date)
+        self.assertTrue(LeaderboardSnapshot.objects.filter(tournament=closed).exists())
+        self.assertFalse(LeaderboardSnapshot.objects.filter(tournament=elsewhere).exists())
+        # it stays closed when edited, or when the lifecycle advances
+        closed.name = 'Renamed'
+        closed.save()
+        lifecycle.advance()
+        self.assertEqual(Tournament.objects.get(id=closed.id).status, 'closed')
+        self.run_action('archive_tournaments', self.tournaments)
+        self.assertEqual(Tournament.objects.get(id=closed.id).status, 'archived')
+        self.assertEqual(Tournament.objects.get(id=self.tournaments[1].id).status, 'ongoing')
+        self.assertEqual(ArchivedScore.objects.count(), 1)
+
+    def test_regenerate_questions(self):
+        '''questions are replaced when the api answers, kept when it fails'''
+        fetched = [{'question': f'New {i}', 'correct_answer': 'a',
+                    'incorrect_answers': ['b', 'c', 'd']} for i in range(10)]
+        Question.objects.create(tournament=self.tournaments[1], question='Old',
+                                correct_answer='a', choices1='a', choices2='b',
+                                choices3='c', choices4='d')
+        Tournament.objects.filter(id=self.tournaments[1].id).update(difficulty='hard')
+        Tournament.objects.update(start_date=datetime.date.today() + datetime.timedelta(days=1),
+                                  status='upcoming')
+        ongoing = Tournament.objects.create(name='Ongoing', category='21', difficulty='easy',
+                                            start_date=datetime.date.today(),
+                                            end_date=datetime.date.today())
+        Question.objects.create(tournament=ongoing, question='Played', correct_answer='a',
+                                choices1='a', choices2='b', choices3='c', choices4='d')
+
+        def questions(category, difficulty, amount):
+            if difficulty == 'hard':
+                raise TriviaError('down')
+            return fetched
+        with mock.patch('tournaments.trivia.client') as client:
+            client.questions.side_effect = questions
+            response = self.run_action('regenerate_questions', self.tournaments + [ongoing])
+        self.assertContains(response, 'their questions are unchanged')
+        self.assertContains(response, '1 not upcoming skipped')
+        self.assertEqual(Question.objects.filter(tournament=self.tournaments[0],
+                                                 question__startswith='New').count(), 10)
+        self.assertEqual(list(Question.objects.filter(tournament=self.tournaments[1])
+                              .values_list('question', flat=True)), ['Old'])
+        self.assertEqual(list(Question.objects.filter(tournament=ongoing)
+                              .values_list('question', flat=True)), ['Played'])
+
+class CounterTestCase(APITestCase):
+    '''Test case for the denormalized tournament counters'''
+    def setUp(self):
+        self.tournament = Tournament.objects.create(name='Counters', category='21',
+                                                    difficulty='easy',
+                                                    start_date=datetime.date.today(),
+                                                    end_date=datetime.date.today())
+        self.question = Question.objects.create(tournament=self.tournament, question='Q',
+                                                correct_answer='a', choices1='a', choices2='b',
+                                                choices3='c', choices4='d')
+        self.user = User.objects.create_user(username='jacob', password='top_secret')
+        self.client.force_login(self.user)
+
+    def counts(self):
+        tournament = Tournament.objects.get(id=self.tournament.id)
+        return (tournament.participant_count, tournament.completion_count,
+                tournament.question_count)
+
+    def test_counted_on_play(self):
+        '''starting counts a participant, the first submission a completion'''
+        kwargs = {'tournament_id': self.tournament.id}
+        self.client.get(reverse('tournament:start_tournament', kwargs=kwargs))
+        self.client.get(reverse('tournament:start_tournament', kwargs=kwargs))
+        self.assertEqual(self.counts(), (1, 0, 0))
+        self.client.post(reverse('tournament:results', kwargs=kwargs),
+                         {str(self.question.id): 'a'})
+        # a second submission is graded, but neither counts nor changes the score
+        response = self.client.post(reverse('tournament:results', kwargs=kwargs),
+                                    {str(self.question.id): 'b'})
+        self.assertContains(response, 'Final Score: 0')
+        self.assertEqual(TournamentPlayer.objects.get(player=self.user).score, 1)
+        self.assertEqual(self.counts(), (1, 1, 0))
+        other = User.objects.create_user(username='other')
+        self.client.force_login(other)
+        self.client.post(reverse('tournament:quiz_answers', kwargs=kwargs),
+                         {'answers': {str(self.question.id): 'b'}}, format='json')
+        self.assertEqual(self.counts(), (2, 2, 0))
+
+    def test_counted_per_tournament_in_batches(self):
+        '''a batch of submissions counts every tournament with one update per count'''
+        tournaments = [self.tournament] + [
+            Tournament.objects.create(name=f'Batch {i}', category='21', difficulty='easy',
+                                      start_date=datetime.date.today(),
+                                      end_date=datetime.date.today()) for i in range(3)]
+        TournamentPlayer.objects.create(tournament=tournaments[3], player=self.user)
+        submissions = [{'tournament': tournament.id, 'answers': {}} for tournament in tournaments]
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(reverse('tournament:quiz_submissions'), submissions, format='json')
+        self.assertEqual([(tournament.participant_count, tournament.completion_count)
+                          for tournament in Tournament.objects.order_by('id')],
+                         [(1, 1)] * 3 + [(0, 1)])
+        counter_updates = [query for query in context.captured_queries
+                           if query['sql'].startswith('UPDATE "tournaments_tournament"')]
+        self.assertEqual(len(counter_updates), 2)
+
+    def test_reconcile_and_api(self):
+        '''drift is repaired and the counts are served by the api'''
+        TournamentPlayer.objects.create(tournament=self.tournament, player=self.user,
+                                        complete_date=datetime.date.today())
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('1 tournaments repaired', out.getvalue())
+        self.assertEqual(self.counts(), (1, 1, 1))
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('0 tournaments repaired', out.getvalue())
+        popular = Tournament.objects.create(name='Popular', category='21', difficulty='easy',
+                                            start_date=datetime.date.today(),
+                                            end_date=datetime.date.today(),
+                                            participant_count=5)
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+        response = self.client.get('/tournaments_api/?ordering=-participant_count')
+        self.assertEqual([row['id'] for row in response.json()],
+                         [popular.id, self.tournament.id])
+        self.assertEqual(response.json()[1]['question_count'], 1)
+
+class ProfilingTestCase(TestCase):
+    '''Test case for the on-demand sampling profiler'''
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'top_secret')
+        self.client.force_login(self.admin)
+        self.url = reverse('tournament:list_all_tournament')
+
+    def profiling(self, **config):
+        return self.settings(PROFILING=dict({'ENABLED': True, 'DIRECTORY': self.directory,
+                                             'INTERVAL': 0.0001, 'SAMPLE_RATES': {},
+                                             'MAX_FILES': 10, 'MAX_AGE': 60}, **config))
+
+    def profiles(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.folded'))
+
+    def test_disabled(self):
+        '''without profiling the middleware is not loaded'''
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_token(self):
+        '''a signed token profiles a request of its url name only'''
+        with self.profiling():
+            token = self.client.get(reverse('tournament:profile_token'),
+                                    {'url_name': 'list_all_tournament'}).json()['token']
+            self.assertNotIn('X-Profile', self.client.get(self.url))
+            self.client.get(self.url, HTTP_X_PROFILE_TOKEN=token[:-1] + 'x')
+            self.client.get(reverse('tournament:player'), HTTP_X_PROFILE_TOKEN=token)
+            self.assertEqual(self.profiles(), [])
+            response = self.client.get(self.url, {'profile': token})
+        self.assertEqual(self.profiles(), [response['X-Profile']])
+        with open(os.path.join(self.directory, response['X-Profile'])) as profile:
+            for line in profile:
+                stack, count = line.rsplit(' ', 1)
+                self.assertIn(';', stack)
+                self.assertGreater(int(count), 0)
+
+    def test_sample_rate_and_retention(self):
+        '''sampled requests are profiled and only the newest profiles are kept'''
+        with self.profiling(SAMPLE_RATES={'list_all_tournament': 1.0}, MAX_FILES=2):
+            for _ in range(4):
+                self.client.get(self.url)
+        self.assertEqual(len(self.profiles()), 2)
+
+class SlowQueryLogTestCase(TestCase):
+    '''Test case for the slow-query log'''
+    def setUp(self):
+        slowqueries.log.clear()
+        self.addCleanup(slowqueries.log.clear)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'top_secret')
+        self.client.force_login(self.admin)
+
+    def test_records_slow_statements_with_plan(self):
+        '''every statement over the threshold is kept with its view, origin and plan'''
+        with self.settings(SLOW_QUERY_LOG={'THRESHOLD_MS': 0, 'SIZE': 100, 'EXPLAIN': True}):
+            self.client.get(reverse('tournament:list_ongoing_tournament'))
+        entries = [entry for entry in slowqueries.log.entries()
+                   if 'tournaments_tournament' in entry['sql']]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['view'], 'tournament:list_ongoing_tournament')
+        self.assertTrue(entries[0]['origin'].startswith('tournaments/'))
+        self.assertIn('tournaments_tournament_status', entries[0]['plan'])
+        self.assertFalse(any(entry['sql'].startswith('EXPLAIN')
+                             for entry in slowqueries.log.entries()))
+
+    def test_ring_buffer(self):
+        '''the log keeps the newest SIZE entries'''
+        log = slowqueries.SlowQueryLog(3)
+        for number in range(5):
+            log.record({'sql': str(number)})
+        self.assertEqual([entry['sql'] for entry in log.entries()], ['4', '3', '2'])
+
+    def test_admin_page(self):
+        '''the log is browsable and cleared by staff only'''
+        slowqueries.log.record({'time': None, 'alias': 'default', 'view': 'tournament:index',
+                                'sql': 'SELECT 1', 'params': '()', 'duration_ms': 250.0,
+                                'origin': 'tournaments/views.py:1 in index', 'plan': None})
+        response = self.client.get(reverse('slow_queries'))
+        self.assertContains(response, 'tournaments/views.py:1 in index')
+        self.client.post(reverse('slow_queries'))
+        self.assertEqual(slowqueries.log.entries(), [])
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('slow_queries')).status_code, 302)
+
+    def test_disabled(self):
+        '''without a threshold the middleware is not loaded'''
+        with self.settings(SLOW_QUERY_LOG={'THRESHOLD_MS': None, 'SIZE': 100, 'EXPLAIN': True}):
+            with self.assertRaises(MiddlewareNotUsed):
+                slowqueries.SlowQueryMiddleware(lambda request: None)
+
+class SearchTestCase(TestCase):
+    '''Test case for the full-text search index and api'''
+    def setUp(self):
+        today = datetime.date.today()
+        self.football = Tournament.objects.create(name='Football legends', category='21',
+                                                  difficulty='easy', start_date=today,
+                                                  end_date=today)
+        self.footnotes = Tournament.objects.create(name='Footnotes of football history',
+                                                   category='23', difficulty='hard',
+                                                   start_date=today, end_date=today)
+        Question.objects.bulk_create(
+            Question(tournament=tournament, question=text, correct_answer='a',
+                     choices1='a', choices2='b', choices3='c', choices4='d')
+            for tournament, text in ((self.football, 'Which club won the first football cup?'),
+                                     (self.footnotes, 'Who painted the Mona Lisa?')))
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'top_secret')
+        self.player = User.objects.create_user('player', 'player@example.com', 'top_secret')
+
+    def names(self, text, **filters):
+        return [row['name'] for row in search.search_tournaments(text, **filters)]
+
+    def test_prefix_matching_and_ranking(self):
+        '''every word matches as a prefix, the best match comes first'''
+        # two words of the footnotes match
+        self.assertEqual(self.names('foot'), ['Footnotes of football history', 'Football legends'])
+        self.assertEqual(self.names('footn'), ['Footnotes of football history'])
+        self.assertEqual(self.names('FOOTBALL leg'), ['Football legends'])
+        # query syntax is not passed through
+        self.assertEqual(self.names('foot" -( leg*'), ['Football legends'])
+        self.assertEqual(self.names('cricket'), [])
+        self.assertEqual(self.names('  '), [])
+
+    def test_filters(self):
+        '''category and difficulty narrow the tournaments and the questions'''
+        self.assertEqual(self.names('foot', category='23'), ['Footnotes of football history'])
+        self.assertEqual(self.names('foot', difficulty='easy'), ['Football legends'])
+        self.assertEqual(self.names('foot', category='23', difficulty='easy'), [])
+        questions = search.search_questions('mona', category='23')
+        self.assertEqual([row['tournament_name'] for row in questions],
+                         ['Footnotes of football history'])
+        self.assertEqual(search.search_questions('mona', category='21'), [])
+
+    def test_incremental_updates(self):
+        '''saves, bulk writes and deletes update the index'''
+        self.football.name = 'Cricket legends'
+        self.football.save()
+        self.assertEqual(self.names('legends'), ['Cricket legends'])
+        Question.objects.filter(tournament=self.football).update(question='Who bowled first?')
+        self.assertEqual([row['question'] for row in search.search_questions('bowl')],
+                         ['Who bowled first?'])
+        self.assertEqual(search.search_questions('club'), [])
+        self.footnotes.delete()
+        self.assertEqual(self.names('foot'), [])
+        self.assertEqual(search.search_questions('mona'), [])
+
+    def test_rebuild(self):
+        '''the command restores a dropped index'''
+        search.uninstall()
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('2 tournaments, 2 questions', out.getvalue())
+        self.assertEqual(self.names('legend'), ['Football legends'])
+
+    def test_triggers_restored_after_migrate(self):
+        '''triggers a migration dropped are created again once it has run'''
+        with connection.cursor() as cursor:
+            for trigger in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER tournaments_tournament_fts_{trigger}')
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        Tournament.objects.create(name='Legendary goals', category='21', difficulty='easy',
+                                  start_date=datetime.date.today(),
+                                  end_date=datetime.date.today())
+        self.assertEqual(self.names('legend'), ['Football legends', 'Legendary goals'])
+
+    def test_api(self):
+        '''questions are searched for admins only, filters are validated'''
+        url = reverse('tournament:search')
+        self.assertEqual(self.client.get(url, {'q': 'foot'}).status_code, 403)
+        self.client.force_login(self.player)
+        response = self.client.get(url, {'q': 'foot', 'limit': '1'})
+        self.assertEqual([row['name'] for row in response.json()['tournaments']],
+                         ['Footnotes of football history'])
+        self.assertNotIn('questions', response.json())
+        self.assertEqual(self.client.get(url, {'q': ''}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'foot', 'category': '99'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'foot', 'difficulty': 'x'}).status_code, 400)
+        self.client.force_login(self.admin)
+        response = self.client.get(url, {'q': 'foot', 'difficulty': 'easy'})
+        self.assertEqual([row['question'] for row in response.json()['questions']],
+                         ['Which club won the first football cup?'])
+
+class FakeTriviaServer:
+    '''
+    Local stand-in for opentdb. Answers with the queued (status, json)
+    responses first, then with a token or the requested number of questions
+    '''
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        self.times = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(self.path)
+                server.times.append(time.monotonic())
+                status_code, body = server.respond(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def respond(self, path):
+        if self.responses:
+            return self.responses.pop(0)
+        query = parse_qs(urlparse(path).query)
+        if path.startswith('/api_token.php'):
+            return 200, {'response_code': 0, 'token': 'fake-token'}
+        amount = int(query['amount'][0])
+        return 200, {'response_code': 0,
+                     'results': [{'question': f'Question {i}', 'correct_answer': 'right',
+                                  'incorrect_answers': ['wrong'] * 3} for i in range(amount)]}
+
+    def api_calls(self):
+        return [path for path in self.requests if path.startswith('/api.php')]
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class TriviaClientTestCase(APITestCase):
+    '''Test case for the trivia api client, against a local fake server'''
+    def setUp(self):
+        self.server = FakeTriviaServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.trivia = TriviaClient(self.server.url, timeout=1, backoff=0, min_interval=0,
+                                   batch_size=25, breaker_threshold=2, breaker_reset=60)
+
+    def test_batches_are_cached(self):
+        '''one api call serves two tournaments of the same kind'''
+        first = self.trivia.questions('21', 'easy', 10)
+        second = self.trivia.questions('21', 'easy', 10)
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 10)
+        self.assertFalse({q['question'] for q in first} & {q['question'] for q in second})
+        self.assertEqual(len(self.server.api_calls()), 1)
+        self.assertIn('token=fake-token', self.server.api_calls()[0])
+
+    def test_retry_and_token_renewal(self):
+        '''server errors are retried, an unknown token is replaced'''
+        self.server.responses = [(200, {'response_code': 0, 'token': 'old-token'}),
+                                 (500, {}),
+                                 (200, {'response_code': 3, 'results': []})]
+        with self.assertLogs('tournaments.trivia', 'WARNING'):
+            self.assertEqual(len(self.trivia.questions('21', 'easy', 10)), 10)
+        self.assertEqual(self.trivia.token, 'fake-token')
+
+    def test_short_response(self):
+        '''fewer valid questions than needed is an error, not a partial result'''
+        self.server.responses = [(200, {'response_code': 0, 'token': 'fake-token'}),
+                                 (200, {'response_code': 1, 'results': []}),
+                                 (200, {'response_code': 0, 'results': [
+                                     {'question': 'Q', 'correct_answer': 'a',
+                                      'incorrect_answers': ['b', 'c', 'd']}] * 9})]
+        with self.assertRaises(TriviaError):
+            self.trivia.questions('21', 'easy', 10)
+
+    def test_client_errors_are_not_retried(self):
+        '''a 4xx answer fails at once and does not count against the api'''
+        self.server.responses = [(404, {})] * 3
+        with self.assertRaises(ClientError):
+            self.trivia.new_token()
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.trivia.breaker.failures, 0)
+
+    def test_rate_limit_is_not_retried(self):
+        '''a rate limited call fails at once and does not count against the api'''
+        for limited in ((200, {'response_code': 5}), (429, {})):
+            self.server.requests = []
+            self.server.responses = [limited] * 3
+            with self.assertRaises(RateLimited):
+                self.trivia.new_token()
+            self.assertEqual(len(self.server.requests), 1)
+            self.assertEqual(self.trivia.breaker.failures, 0)
+
+    def test_calls_are_spaced(self):
+        '''back to back token and question calls keep the minimum interval'''
+        self.trivia.min_interval = 0.2
+        self.trivia.questions('21', 'easy', 10)
+        self.assertEqual(len(self.server.times), 2)
+        self.assertGreaterEqual(self.server.times[1] - self.server.times[0], 0.2)
+
+    def test_fetch_does_not_hold_the_cache(self):
+        '''a slow fetch does not hold up tournaments served from the cache'''
+        self.trivia.questions('21', 'easy', 10)
+        fetching, release = threading.Event(), threading.Event()
+
+        def slow_fetch(category, difficulty, amount):
+            fetching.set()
+            release.wait(5)
+            return []
+        with mock.patch.object(self.trivia, 'fetch', slow_fetch):
+            worker = threading.Thread(
+                target=lambda: self.assertRaises(TriviaError, self.trivia.questions,
+                                                 '22', 'easy', 10))
+            worker.start()
+            self.assertTrue(fetching.wait(5))
+            self.assertEqual(len(self.trivia.questions('21', 'easy', 10)), 10)
+            release.set()
+            worker.join(5)
+
+    def test_circuit_breaker(self):
+        '''after repeated failures the api is not called any more'''
+        self.server.responses = [(503, {})] * 6
+        for _ in range(2):
+            with self.assertRaises(TriviaError), self.assertLogs('tournaments.trivia', 'WARNING'):
+                self.trivia.new_token()
+        calls = len(self.server.requests)
+        with self.assertRaises(CircuitOpen):
+            self.trivia.new_token()
+        self.assertEqual(len(self.server.requests), calls)
+
+    def test_create_tournament(self):
+        '''a tournament is created with its questions, or not at all'''
+        User.objects.create_superuser('myuser', 'myemail@test.com', 'mypassword')
+        self.client.login(username='myuser', password='mypassword')
+        data = {'name': 'Trivia', 'category': '21', 'difficulty': 'easy',
+                'start_date': datetime.date.today(), 'end_date': datetime.date.today()}
+        url = reverse('tournament:create_tournament')
+        with mock.patch('tournaments.trivia.client', self.trivia):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(Question.objects.filter(tournament_id=response.data['id']).count(), 10)
+            self.server.responses = [(200, {'response_code': 1, 'results': []})] * 2
+            data['difficulty'] = 'hard'
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(Tournament.objects.count(), 1)
+
 class AccountTestCase(LiveServerTestCase):
     '''End to end testing using selenium'''
 
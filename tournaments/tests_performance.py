@@ -0,0 +1,199 @@
+'''
+Query budgets of the tournaments views.
+
+Every url name of tournaments/urls.py declares the most queries it may run
+and the most rows it may fetch, measured against a database of realistic
+size. A view that starts querying per row (e.g. through a related field in a
+template) breaks its budget and the test lists the SQL it ran.
+'''
+import datetime
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from unittest import mock
+from . import autosave, urls
+from .models import Tournament, Question, TournamentPlayer
+
+PLAYERS = 2000
+TOURNAMENTS = 1500  # a third each past, ongoing and upcoming
+QUESTIONS = 10
+
+# url name: (max queries, max rows fetched). A logged in request costs two
+# queries and rows of its own, the session and the user, and a transaction
+# costs two more in tests, its savepoint and release.
+BUDGETS = {
+    'index': (0, 0),
+    'player': (2, 2),
+    'signup': (0, 0),
+    'results': (8, QUESTIONS + 3),
+    'start_tournament': (9, QUESTIONS + 3),
+    'highscore': (5, PLAYERS + 3),
+    'list_all_tournament': (3, TOURNAMENTS + 2),
+    'list_ongoing_tournament': (3, TOURNAMENTS // 3 + 2),
+    'list_upcoming_tournament': (3, TOURNAMENTS // 3 + 2),
+    'list_past_tournament': (3, TOURNAMENTS // 3 + 2),
+    'tournament_question': (4, QUESTIONS + 2),
+    'list_tournament_api': (3, TOURNAMENTS + 2),
+    'edit_tournament': (3, 3),
+    'create_tournament': (3, TOURNAMENTS + 2),
+    'quiz_questions': (4, QUESTIONS + 3),
+    'quiz_autosave': (2, 2),
+    'quiz_answers': (9, QUESTIONS + 3),
+    'quiz_submissions': (9, QUESTIONS + 3),
+    'admission_stats': (2, 2),
+    'profile_token': (2, 2),
+    'search': (4, 2 + 2 * 20),
+    'api-root': (0, 0),
+}
+
+
+class RowCounter:
+    '''
+    counts the rows fetched by every query captured by the context
+    '''
+    def __init__(self, context):
+        self.context = context
+        self.rows = {}
+
+    def add(self, rows):
+        index = len(self.context.captured_queries) - 1
+        self.rows[index] = self.rows.get(index, 0) + rows
+
+    def patches(self):
+        counter = self
+
+        def fetchone(self):
+            row = self.__getattr__('fetchone')()
+            counter.add(row is not None)
+            return row
+
+        def fetchmany(self, *args):
+            rows = self.__getattr__('fetchmany')(*args)
+            counter.add(len(rows))
+            return rows
+
+        def fetchall(self):
+            rows = self.__getattr__('fetchall')()
+            counter.add(len(rows))
+            return rows
+        return [mock.patch.object(CursorWrapper, name, method, create=True)
+                for name, method in (('fetchone', fetchone),
+                                     ('fetchmany', fetchmany),
+                                     ('fetchall', fetchall))]
+
+
+# autosaves are buffered in the configured ANSWER_BUFFER_CACHE, so its
+# queries, if any, count against the budgets
+class QueryBudgetTestCase(TestCase):
+    '''Query and row budgets of every view'''
+    @classmethod
+    def setUpTestData(cls):
+        '''players, tournaments and a played tournament of realistic size'''
+        today = datetime.date.today()
+        day = datetime.timedelta(days=1)
+        # '!' is an unusable password, hashing thousands of them is not the point
+        User.objects.bulk_create(User(username=f'player{i}', password='!')
+                                 for i in range(PLAYERS))
+        dates = [(today - 10 * day, today - 5 * day),  # past
+                 (today - day, today + day),  # ongoing
+                 (today + 5 * day, today + 10 * day)]  # upcoming
+        for start_date, end_date in dates:
+            tournaments = [Tournament(name='Tournament', category='21', difficulty='easy',
+                                      start_date=start_date, end_date=end_date)
+                           for _ in range(TOURNAMENTS // 3)]
+            for tournament in tournaments:
+                # bulk_create skips save(), which derives the status
+                tournament.status = tournament.status_on(today)
+            Tournament.objects.bulk_create(tournaments)
+        cls.tournament = Tournament.objects.filter(start_date=today - day).first()
+        Question.objects.bulk_create(
+            Question(tournament=cls.tournament, question=f'Question {i}', correct_answer='a',
+                     choices1='a', choices2='b', choices3='c', choices4='d')
+            for i in range(QUESTIONS))
+        TournamentPlayer.objects.bulk_create(
+            TournamentPlayer(tournament=cls.tournament, player=player, score=index % 11,
+                             complete_date=today)
+            for index, player in enumerate(User.objects.all()))
+        cls.admin = User.objects.create(username='admin', is_staff=True, is_superuser=True,
+                                        password=make_password(None))
+        cls.player = User.objects.create(username='newcomer', password=make_password(None))
+
+    def request(self, name):
+        '''
+        a typical request of the url name, by the user who would send it
+        '''
+        tournament_id = self.tournament.id
+        if name in ('results', 'start_tournament', 'highscore', 'tournament_question',
+                    'quiz_questions', 'quiz_autosave', 'quiz_answers'):
+            url = reverse(f'tournament:{name}', kwargs={'tournament_id': tournament_id})
+        elif name == 'edit_tournament':
+            url = reverse(f'tournament:{name}', kwargs={'pk': tournament_id})
+        elif name == 'search':
+            url = reverse('tournament:search') + '?q=tourn&category=21'
+        else:
+            url = reverse(f'tournament:{name}')
+        if name in ('index', 'signup', 'api-root'):
+            self.client.logout()
+            return lambda: self.client.get(url)
+        if name in ('tournament_question', 'list_tournament_api', 'edit_tournament',
+                    'create_tournament', 'admission_stats', 'profile_token', 'search'):
+            self.client.force_login(self.admin)
+            return lambda: self.client.get(url)
+        # a newcomer plays the tournament everyone else has finished
+        TournamentPlayer.objects.filter(player=self.player).delete()
+        caches[settings.ANSWER_BUFFER_CACHE].clear()
+        self.client.force_login(self.player)
+        answers = {str(question.id): 'a' for question in self.tournament.question_set.all()}
+        if name in ('results', 'quiz_autosave'):
+            TournamentPlayer.objects.create(tournament=self.tournament, player=self.player)
+            autosave.start(tournament_id, self.player.id, [int(key) for key in answers])
+        if name == 'results':
+            return lambda: self.client.post(url, answers)
+        if name in ('quiz_autosave', 'quiz_answers'):
+            return lambda: self.client.post(url, {'answers': answers},
+                                            content_type='application/json')
+        if name == 'quiz_submissions':
+            return lambda: self.client.post(
+                url, [{'tournament': tournament_id, 'answers': answers}],
+                content_type='application/json')
+        return lambda: self.client.get(url)
+
+    def measure(self, send):
+        '''the response, the captured queries and the rows fetched per query'''
+        with CaptureQueriesContext(connection) as context:
+            counter = RowCounter(context)
+            patches = counter.patches()
+            for patch in patches:
+                patch.start()
+            try:
+                response = send()
+            finally:
+                for patch in patches:
+                    patch.stop()
+        return response, context.captured_queries, counter.rows
+
+    def test_every_url_has_a_budget(self):
+        '''a new url name must declare its budget'''
+        names = {pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+        self.assertEqual(names, set(BUDGETS))
+
+    def test_budgets(self):
+        '''no view runs more queries or fetches more rows than its budget'''
+        for name, (max_queries, max_rows) in BUDGETS.items():
+            with self.subTest(name):
+                response, queries, rows = self.measure(self.request(name))
+                self.assertLess(response.status_code, 400)
+                report = '\n'.join(f'{index + 1}. [{rows.get(index, 0)} rows] {query["sql"]}'
+                                   for index, query in enumerate(queries))
+                self.assertLessEqual(len(queries), max_queries,
+                                     f'{name} ran {len(queries)} queries, budget '
+                                     f'{max_queries}:\n{report}')
+                self.assertLessEqual(sum(rows.values()), max_rows,
+                                     f'{name} fetched {sum(rows.values())} rows, budget '
+                                     f'{max_rows}:\n{report}')
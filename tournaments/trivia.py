@@ -0,0 +1,248 @@
+'''
+Client of the Open Trivia DB api used to fill new tournaments.
+
+All calls share one keep-alive session with a bounded connection pool. Every
+attempt has a connect and read timeout, failed attempts other than client
+errors are retried with jittered exponential backoff, and a circuit breaker
+fails fast while the api is down, so creating a tournament takes a bounded
+time even when opentdb does not answer. opentdb allows one call per IP every
+5 seconds, so calls are spaced by MIN_INTERVAL, and a rate limited call is
+not retried, as an immediate retry would be limited too. An api session token keeps opentdb
+from handing out the same question twice. Questions are fetched in batches
+per category and difficulty; the unused rest of a batch is kept for a short
+while and serves the next tournament of the same kind without calling the
+api.
+'''
+import logging
+import random
+import threading
+import time
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# opentdb response codes
+SUCCESS, NO_RESULTS, INVALID_PARAMETER, TOKEN_NOT_FOUND, TOKEN_EMPTY, RATE_LIMIT = range(6)
+
+
+class TriviaError(Exception):
+    '''the api did not provide the questions'''
+
+
+class NotEnoughQuestions(TriviaError):
+    '''the category has fewer questions of the difficulty than requested'''
+
+
+class ClientError(TriviaError):
+    '''the api refused the request, retrying would not help'''
+
+
+class RateLimited(ClientError):
+    '''the api is rate limiting this IP'''
+
+
+class CircuitOpen(TriviaError):
+    '''the api failed repeatedly and is not called for a while'''
+
+
+class CircuitBreaker:
+    '''
+    Opens after threshold consecutive failures; once reset_timeout seconds
+    have passed one trial call is let through, which closes it again on
+    success
+    '''
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        '''True when a call may be made'''
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # half open: let one call through, the next failure reopens it
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class TriviaClient:
+    '''
+    Pooled, retrying opentdb client with a session token and a batch cache
+    '''
+    def __init__(self, url, timeout=(3.05, 5), retries=2, backoff=0.5, min_interval=5,
+                 pool_size=10, batch_size=50, cache_ttl=300, breaker_threshold=5,
+                 breaker_reset=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.min_interval = min_interval
+        self._next_call = 0
+        self._pace_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.cache_ttl = cache_ttl
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.token = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def pace(self):
+        '''
+        wait for the next free call slot, so calls are min_interval apart.
+        The slot is reserved under the lock, the wait happens outside it.
+        '''
+        with self._pace_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_call)
+            self._next_call = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def get(self, path, params):
+        '''
+        json of a GET request, retried on connection errors, timeouts and
+        server errors, not on client errors or rate limiting
+        '''
+        if not self.breaker.allow():
+            raise CircuitOpen('trivia api unavailable')
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # full jitter, so clients that failed together do not retry together
+                time.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            self.pace()
+            try:
+                response = self.session.get(self.url + path, params=params,
+                                            timeout=self.timeout)
+                if response.status_code == 429:
+                    # the api is up, another process used up the allowance
+                    raise RateLimited(f'trivia api {path} rate limited')
+                if response.status_code >= 500:
+                    raise TriviaError(f'trivia api returned {response.status_code}')
+                if response.status_code >= 400:
+                    # a client error is the same on every attempt, and the api is up
+                    self.breaker.success()
+                    raise ClientError(f'trivia api {path} returned {response.status_code}')
+                data = response.json()
+                if data.get('response_code') == RATE_LIMIT:
+                    raise RateLimited(f'trivia api {path} rate limited')
+            except ClientError:
+                raise
+            except (requests.RequestException, ValueError, TriviaError) as error:
+                logger.warning('trivia api %s attempt %d failed: %s', path, attempt + 1, error)
+                continue
+            self.breaker.success()
+            return data
+        self.breaker.failure()
+        raise TriviaError(f'trivia api {path} failed after {self.retries + 1} attempts')
+
+    def new_token(self):
+        '''a fresh session token, questions are not repeated within a token'''
+        data = self.get('/api_token.php', {'command': 'request'})
+        if data.get('response_code') != SUCCESS or not data.get('token'):
+            raise TriviaError('trivia api returned no session token')
+        self.token = data['token']
+        return self.token
+
+    def reset_token(self):
+        '''start the token over once every question has been handed out'''
+        self.get('/api_token.php', {'command': 'reset', 'token': self.token})
+
+    def fetch(self, category, difficulty, amount):
+        '''
+        amount questions from the api, renewing or resetting the token when
+        opentdb asks for it
+        '''
+        token = self.token or self.new_token()
+        for _ in range(2):
+            data = self.get('/api.php', {'amount': amount, 'category': category,
+                                         'difficulty': difficulty, 'type': 'multiple',
+                                         'token': token})
+            code = data.get('response_code')
+            if code == SUCCESS:
+                return data.get('results', [])
+            if code == TOKEN_NOT_FOUND:
+                token = self.new_token()
+            elif code == TOKEN_EMPTY:
+                self.reset_token()
+            elif code == NO_RESULTS:
+                raise NotEnoughQuestions(f'not {amount} questions for category {category} '
+                                         f'and difficulty {difficulty}')
+            else:
+                break
+        raise TriviaError(f'trivia api response code {code} for category {category} '
+                          f'and difficulty {difficulty}')
+
+    def questions(self, category, difficulty, amount):
+        '''
+        exactly amount valid questions of the category and difficulty, raises
+        TriviaError otherwise
+        '''
+        key = (str(category), str(difficulty))
+        # the lock only guards the cache, the api is called without it so a
+        # slow or retried fetch does not hold up the other tournaments
+        with self._lock:
+            fetched_at, cached = self._cache.pop(key, (0, []))
+            if time.monotonic() - fetched_at <= self.cache_ttl and len(cached) >= amount:
+                self.keep(key, fetched_at, cached[amount:])
+                return cached[:amount]
+        try:
+            batch = self.fetch(category, difficulty, max(amount, self.batch_size))
+        except NotEnoughQuestions:
+            if self.batch_size <= amount:
+                raise
+            # the category has fewer questions than a batch
+            batch = self.fetch(category, difficulty, amount)
+        fresh = [question for question in batch if valid(question)]
+        if len(fresh) < amount:
+            raise TriviaError(f'trivia api returned {len(fresh)} valid questions, '
+                              f'{amount} needed')
+        with self._lock:
+            self.keep(key, time.monotonic(), fresh[amount:])
+        return fresh[:amount]
+
+    def keep(self, key, fetched_at, rest):
+        '''
+        cache the unused rest of a batch, replacing an older rest stored by a
+        concurrent fetch. Call with the lock held.
+        '''
+        if rest and fetched_at >= self._cache.get(key, (0, []))[0]:
+            self._cache[key] = (fetched_at, rest)
+
+def valid(question):
+    '''a multiple choice question with its answer and three wrong answers'''
+    return (bool(question.get('question')) and bool(question.get('correct_answer'))
+            and len(question.get('incorrect_answers') or []) == 3)
+
+
+client = TriviaClient(settings.TRIVIA_API['URL'],
+                      timeout=settings.TRIVIA_API['TIMEOUT'],
+                      retries=settings.TRIVIA_API['RETRIES'],
+                      backoff=settings.TRIVIA_API['BACKOFF'],
+                      min_interval=settings.TRIVIA_API['MIN_INTERVAL'],
+                      pool_size=settings.TRIVIA_API['POOL_SIZE'],
+                      batch_size=settings.TRIVIA_API['BATCH_SIZE'],
+                      cache_ttl=settings.TRIVIA_API['CACHE_TTL'],
+                      breaker_threshold=settings.TRIVIA_API['BREAKER_THRESHOLD'],
+                      breaker_reset=settings.TRIVIA_API['BREAKER_RESET'])
@@ -29,9 +29,17 @@ urlpatterns = [
          views.TournamentView.list_past_tournament, name='list_past_tournament'),
     path('tournaments/<int:tournament_id>/questions',
          views.TournamentView.list_tournament_question, name='tournament_question'),
-    path('tournaments_api/', views.TournamentList.as_view()),
+    path('tournaments_api/', views.TournamentList.as_view(), name='list_tournament_api'),
     path('tournaments_api/<int:pk>/', views.TournamentDetail.as_view(), name='edit_tournament'),
     path('tournaments_api/create/', views.TournamentCreate.as_view(), name='create_tournament'),
+    path('quiz_api/<int:tournament_id>/', views.QuizQuestions.as_view(), name='quiz_questions'),
+    path('quiz_api/<int:tournament_id>/answers/', views.QuizAnswers.as_view(), name='quiz_answers'),
+    path('quiz_api/<int:tournament_id>/autosave/', views.QuizAutosave.as_view(),
+         name='quiz_autosave'),
+    path('search_api/', views.Search.as_view(), name='search'),
+    path('quiz_api/submissions/', views.QuizSubmissions.as_view(), name='quiz_submissions'),
+    path('ops/admission/', views.AdmissionStats.as_view(), name='admission_stats'),
+    path('ops/profile-token/', views.ProfileToken.as_view(), name='profile_token'),
 ]
 urlpatterns = format_suffix_patterns(urlpatterns)
 urlpatterns += router.urls
@@ -3,21 +3,63 @@ View class for tournaments application
 '''
 import datetime
 import random
-import requests as rq
+from collections import Counter
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import login, authenticate
+from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
-from django.db.models import Avg
+from django.db.models import Prefetch
 from django.shortcuts import render, redirect
 from django.views.generic import TemplateView
-from rest_framework import mixins, generics
+from django.db import transaction
+from django.http import Http404, JsonResponse
+from rest_framework import mixins, generics, status
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
-from rest_framework.permissions import IsAdminUser
-from .models import Tournament, Question, TournamentPlayer
-from .serializers import TournamentSerializer
+from rest_framework.filters import OrderingFilter
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from . import (admission, autosave, counters, lifecycle, profiling, read_models, search,
+               snapshots, trivia)
+from .live import publish_score
+from .models import (Tournament, Question, TournamentPlayer, UPCOMING, ONGOING, CLOSED, ARCHIVED,
+                     CATEGORY_CHOICE, DIFFICULTY_CHOICE)
+from .renderers import FastJSONRenderer
+from .serializers import TournamentSerializer, TournamentReadSerializer, SubmissionSerializer
+from .writebehind import score_queue
 
 
 NUMBER_OF_QUESTIONS = 10
+# longest answer buffered by the autosave, the length of the choice columns
+MAX_ANSWER_LENGTH = 500
+# results per list of the search api, by default and at most
+SEARCH_LIMIT, SEARCH_MAX_LIMIT = 20, 100
+
+def grade(questions, answers):
+    '''
+    Compare answers, a mapping of question id to the chosen answer, with the
+    questions' correct answers. Returns the number of correct answers and the
+    (question, given answer) pairs that are wrong
+    '''
+    incorrect = [(question, answers.get(str(question.id))) for question in questions
+                 if question.correct_answer != answers.get(str(question.id))]
+    return len(questions) - len(incorrect), incorrect
+
+def answers_of(data):
+    '''
+    the answers of a {"answers": {...}} request body, None for a body that is
+    not an object so the serializer rejects it
+    '''
+    return data.get('answers') if isinstance(data, dict) else None
+
+def ordered(request, tournaments):
+    '''
+    Tournaments of a list page, most players first with ?sort=popular
+    '''
+    if request.GET.get('sort') == 'popular':
+        return tournaments.order_by('-participant_count', 'id')
+    return tournaments
 
 class Index(TemplateView):
     '''
@@ -41,11 +83,9 @@ class Index(TemplateView):
         if request.method == 'POST':
             form = UserCreationForm(request.POST)
             if form.is_valid():
-                form.save()
-                username = form.cleaned_data.get('username')
-                raw_password = form.cleaned_data.get('password1')
-                user = authenticate(username=username, password=raw_password)
-                login(request, user)
+                user = form.save()
+                #log the new user in directly, authenticate() would hash the password again
+                login(request, user, backend='django.contrib.auth.backends.ModelBackend')
                 return redirect('/player')
         else:
             form = UserCreationForm()
@@ -62,7 +102,7 @@ class TournamentView(TemplateView):
         '''
         List all the tournaments in the database
         '''
-        tournaments = Tournament.objects.all()
+        tournaments = read_models.tournaments(ordered(request, Tournament.objects.all()))
         return render(request, 'tournaments_list.html', {'tournaments': tournaments})
 
     @login_required
@@ -70,19 +110,25 @@ class TournamentView(TemplateView):
         '''
         List all the question of a tournament
         '''
-        questions = Question.objects.all().filter(tournament_id=tournament_id)
+        questions = read_models.questions(lifecycle.questions(tournament_id))
         return render(request, 'questions_list.html', {'questions': questions})
 
     @login_required
-    def list_tournament_highscore(request, tournament_id):
-        '''
-        List the score, participant and average sore for a tournament
-        '''
-        tour_play = TournamentPlayer.objects.filter(tournament_id=tournament_id).order_by('-score')
-        total_taken = tour_play.count()
-        average = tour_play.aggregate(Avg('score'))
-        return render(request, 'highscore.html',
-                      {'tour_play': tour_play, 'total_taken': total_taken, 'average':average})
+    def list_tournament_highscore(request, tournament_id, format=None):
+        '''
+        List the score, participant and average sore for a tournament, as html or
+        as json with the .json suffix. Closed tournaments are served from their
+        frozen snapshot.
+        '''
+        extension = 'json' if format == 'json' else 'html'
+        snapshot = snapshots.serve(request, tournament_id, extension)
+        if snapshot is not None:
+            return snapshot
+        #under write-behind, scores still queued show up with the next timed flush
+        context = snapshots.leaderboard(tournament_id)
+        if extension == 'json':
+            return JsonResponse(snapshots.leaderboard_json(tournament_id, context))
+        return render(request, 'highscore.html', context)
 
     @login_required
     def list_ongoing_tournament(request):
@@ -90,8 +136,8 @@ class TournamentView(TemplateView):
         List all ongoing tournaments in the database
         '''
         tournaments_ongoing = True
-        tournaments = Tournament.objects.filter(start_date__lte=datetime.date.today(),
-                                                end_date__gte=datetime.date.today())
+        tournaments = read_models.tournaments(
+            ordered(request, Tournament.objects.filter(status=ONGOING)))
         return render(request, 'tournaments_list.html',
                       {'tournaments': tournaments, 'tournaments_ongoing':tournaments_ongoing})
 
@@ -100,7 +146,8 @@ class TournamentView(TemplateView):
         '''
         List all upcoming tournaments in the database
         '''
-        tournaments = Tournament.objects.filter(start_date__gte=datetime.date.today())
+        tournaments = read_models.tournaments(
+            ordered(request, Tournament.objects.filter(status=UPCOMING)))
         return render(request, 'tournaments_list.html', {'tournaments': tournaments})
 
     @login_required
@@ -109,11 +156,66 @@ class TournamentView(TemplateView):
         List all past tournaments in the database
         '''
         tournaments_ongoing = False
-        tournaments = Tournament.objects.filter(end_date__lte=datetime.date.today())
+        tournaments = read_models.tournaments(
+            ordered(request, Tournament.objects.filter(status__in=[CLOSED, ARCHIVED])))
         return render(request, 'tournaments_list.html',
                       {'tournaments': tournaments, 'tournaments_ongoing':tournaments_ongoing})
 
-class TournamentList(mixins.ListModelMixin,
+class TournamentReadMixin:
+    """
+    Read path of the tournament api. Rows are fetched with .values() and
+    serialized with the lightweight TournamentReadSerializer; ?expand=questions
+    adds the questions of every tournament, loaded with one prefetch query.
+    ?ordering=-participant_count lists the most popular tournaments first.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['participant_count', 'completion_count', 'question_count',
+                       'start_date', 'end_date', 'name']
+
+    question_fields = ['id', 'question', 'correct_answer',
+                       'choices1', 'choices2', 'choices3', 'choices4']
+
+    def read_rows(self, queryset):
+        '''
+        tournament rows of the queryset, with their questions when expanded
+        '''
+        fields = TournamentSerializer.Meta.fields
+        if 'questions' not in self.request.query_params.get('expand', '').split(','):
+            return list(queryset.values(*fields))
+        questions = Question.objects.only('tournament_id', *self.question_fields).order_by('id')
+        rows = []
+        for tournament in queryset.only(*fields).prefetch_related(
+                Prefetch('question_set', queryset=questions)):
+            row = {field: getattr(tournament, field) for field in fields}
+            row['questions'] = [{'id': question.id,
+                                 'question': question.question,
+                                 'correct_answer': question.correct_answer,
+                                 'choices': [question.choices1, question.choices2,
+                                             question.choices3, question.choices4]}
+                                for question in tournament.question_set.all()]
+            rows.append(row)
+        return rows
+
+    def read_list(self, request):
+        '''
+        list response built from the read rows
+        '''
+        rows = self.read_rows(self.filter_queryset(self.get_queryset()))
+        return Response(TournamentReadSerializer(rows, many=True).data)
+
+    def read_detail(self, request):
+        '''
+        detail response built from the read row
+        '''
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        rows = self.read_rows(self.get_queryset().filter(**lookup))
+        if not rows:
+            raise Http404
+        return Response(TournamentReadSerializer(rows[0]).data)
+
+class TournamentList(TournamentReadMixin,
+                     mixins.ListModelMixin,
                      generics.GenericAPIView):
     """
     List all tournaments, using mixin web api navigation
@@ -126,12 +228,13 @@ class TournamentList(mixins.ListModelMixin,
 
     def get(self, request, *args, **kwargs):
         '''
-        mixins get method
+        list tournaments through the read path
         '''
-        return self.list(request, *args, **kwargs)
+        return self.read_list(request)
 
 
-class TournamentDetail(mixins.RetrieveModelMixin,
+class TournamentDetail(TournamentReadMixin,
+                       mixins.RetrieveModelMixin,
                        mixins.UpdateModelMixin,
                        mixins.DestroyModelMixin,
                        generics.GenericAPIView):
@@ -146,9 +249,9 @@ class TournamentDetail(mixins.RetrieveModelMixin,
 
     def get(self, request, *args, **kwargs):
         '''
-        mixins get method
+        retrieve the tournament through the read path
         '''
-        return self.retrieve(request, *args, **kwargs)
+        return self.read_detail(request)
 
     def put(self, request, *args, **kwargs):
         '''
@@ -156,13 +259,28 @@ class TournamentDetail(mixins.RetrieveModelMixin,
         '''
         return self.update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        '''
+        the dates may have changed, drop the frozen leaderboard
+        '''
+        super().perform_update(serializer)
+        snapshots.remove(serializer.instance.id)
+
+    def perform_destroy(self, instance):
+        '''
+        delete the tournament and its frozen leaderboard
+        '''
+        snapshots.remove(instance.id)
+        super().perform_destroy(instance)
+
     def delete(self, request, *args, **kwargs):
         '''
         mixins delete method
         '''
         return self.destroy(request, *args, **kwargs)
 
-class TournamentCreate(mixins.RetrieveModelMixin,
+class TournamentCreate(TournamentReadMixin,
+                       mixins.RetrieveModelMixin,
                        mixins.CreateModelMixin,
                        mixins.ListModelMixin,
                        generics.GenericAPIView):
@@ -176,42 +294,56 @@ class TournamentCreate(mixins.RetrieveModelMixin,
 
     def get(self, request, *args, **kwargs):
         '''
-        mixins get method
+        list tournaments through the read path
         '''
-        return self.list(request, *args, **kwargs)
+        return self.read_list(request)
 
     def post(self, request, *args, **kwargs):
         '''
-        creating a tournament and get the question using api and store it together in the database
-        '''
-        tournament = self.create(request, *args, **kwargs)
-        difficulty = tournament.data['difficulty']
-        category = tournament.data['category']
-        api_string = f'https://opentdb.com/api.php?amount=10&category={category}&difficulty={difficulty}&type=multiple'
-        questions_json = rq.get(api_string).json() #requesting api from the link
-        self.create_questions(questions_json, tournament)
-        return tournament
+        creating a tournament and get the question using api and store it together in the database.
+        The questions are fetched first, so a failing api leaves no tournament without questions
+        '''
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            questions = trivia.client.questions(serializer.validated_data['category'],
+                                                serializer.validated_data['difficulty'],
+                                                NUMBER_OF_QUESTIONS)
+        except trivia.TriviaError as error:
+            return Response({'detail': f'Questions are unavailable, please retry later ({error})'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        with transaction.atomic():
+            self.perform_create(serializer)
+            self.create_questions(questions, serializer.instance)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-    def create_questions(self, questions_json, tournament):
+    def create_questions(self, questions, tournament):
         '''Creating the 10 questions'''
+        new_questions = Question.objects.bulk_create(self.build_questions(questions, tournament))
+        counters.add(tournament.id, questions=len(new_questions))
+
+    @staticmethod
+    def build_questions(questions, tournament):
+        '''Unsaved questions of the api results, the correct answer at a random position'''
         random_order = [1, 2, 3, 0] #declare array to randomize the choices' order
-        for ques in range(NUMBER_OF_QUESTIONS):
-            question = questions_json['results'][ques]['question']
-            correct_answer = questions_json['results'][ques]['correct_answer']
+        new_questions = []
+        for ques in questions:
             choices = [None, None, None, None] #declaring empty array
             #randoming the random_order array and filling in the choices
             random.shuffle(random_order)
-            choices[random_order[0]] = questions_json['results'][ques]['incorrect_answers'][0]
-            choices[random_order[1]] = questions_json['results'][ques]['incorrect_answers'][1]
-            choices[random_order[2]] = questions_json['results'][ques]['incorrect_answers'][2]
-            choices[random_order[3]] = questions_json['results'][ques]['correct_answer']
-            Question.objects.create(tournament=Tournament.objects.get(id=tournament.data['id']),
-                                    question=question,
-                                    correct_answer=correct_answer,
-                                    choices1=choices[0],
-                                    choices2=choices[1],
-                                    choices3=choices[2],
-                                    choices4=choices[3])
+            choices[random_order[0]] = ques['incorrect_answers'][0]
+            choices[random_order[1]] = ques['incorrect_answers'][1]
+            choices[random_order[2]] = ques['incorrect_answers'][2]
+            choices[random_order[3]] = ques['correct_answer']
+            new_questions.append(Question(tournament=tournament,
+                                          question=ques['question'],
+                                          correct_answer=ques['correct_answer'],
+                                          choices1=choices[0],
+                                          choices2=choices[1],
+                                          choices3=choices[2],
+                                          choices4=choices[3]))
+        return new_questions
 
 class QuestionQuiz(TemplateView):
     '''
@@ -222,43 +354,338 @@ class QuestionQuiz(TemplateView):
         '''
         Starting the tournament, this method check if the user
         has taken the tournament or not, if not it will get the
-        tournament id and user id and create a database entry
-        '''
-        if not TournamentPlayer.objects.filter(tournament_id=tournament_id,
-                                               player_id=request.user.id).exists():
-            TournamentPlayer.objects.create(tournament=Tournament.objects.get(id=tournament_id),
-                                            player=request.user)
-            questions = Question.objects.all().filter(tournament_id=tournament_id)
-            return render(request, 'question.html',
-                          {'questions': questions, 'tournament_id':tournament_id})
-        else:
+        tournament id and user id and create a database entry.
+        A player who has started but not submitted resumes with
+        the answers autosaved so far. Closed and archived tournaments
+        cannot be entered any more
+        '''
+        tournament_status = Tournament.objects.filter(id=tournament_id).values_list(
+            'status', flat=True).first()
+        if tournament_status is None:
+            raise Http404
+        if tournament_status in (CLOSED, ARCHIVED):
+            closed = 'This tournament is closed'
+            return render(request, 'players.html', {'taken':closed})
+        tour_play = TournamentPlayer.objects.filter(tournament_id=tournament_id,
+                                                    player_id=request.user.id).only(
+                                                        'complete_date').first()
+        if tour_play is not None and tour_play.complete_date is not None:
             taken = 'You have taken the tournament already'
             return render(request, 'players.html', {'taken':taken})
+        if tour_play is None:
+            with transaction.atomic():
+                TournamentPlayer.objects.create(tournament_id=tournament_id, player=request.user)
+                counters.add(tournament_id, participants=1)
+        questions = read_models.questions(Question.objects.filter(tournament_id=tournament_id))
+        question_ids = [question.id for question in questions]
+        autosave.start(tournament_id, request.user.id, question_ids)
+        saved = autosave.load(tournament_id, request.user.id, question_ids)
+        for question in questions:
+            question.saved_answer = saved.get(str(question.id))
+        return render(request, 'question.html',
+                      {'questions': questions, 'tournament_id':tournament_id})
 
     @login_required
     def results(request, tournament_id):
         '''
         Processing the number of correct answer the user has given
-        and give a result
-        '''
-        questions = Question.objects.all().filter(tournament_id=tournament_id)
-        #getting the question id so that it can retrieve the value(user answers) from the form
-        question_ids = [str(questions[id].id)for id in range(len(questions))]
-        user_answers = [request.POST.get(question_ids[id]) for id in range(len(questions))]
-        #getting the incorrect answer's question
-        incorrect_match_question = [questions[i] for i in range(len(questions))
-                                    if questions[i].correct_answer != user_answers[i]]
-        user_incorrect_answer = [user_answers[i] for i in range(len(questions))
-                                 if questions[i].correct_answer != user_answers[i]]
-        #count the correct answer
-        correct_count = len(questions)-len(incorrect_match_question)
-        #save score
-        tour_play = TournamentPlayer.objects.get(tournament_id=tournament_id,
-                                                 player_id=request.user.id)
-        tour_play.score = correct_count
-        tour_play.complete_date = datetime.date.today()
-        tour_play.save()
+        and give a result. A closed tournament takes no more results, its
+        leaderboard is final; the questions of an archived one are gone
+        from the hot tables
+        '''
+        tournament_status = Tournament.objects.filter(id=tournament_id).values_list(
+            'status', flat=True).first()
+        if tournament_status is None:
+            raise Http404
+        if tournament_status == ARCHIVED:
+            archived = 'This tournament is archived'
+            return render(request, 'players.html', {'taken':archived},
+                          status=status.HTTP_410_GONE)
+        if tournament_status == CLOSED:
+            closed = 'This tournament is closed'
+            return render(request, 'players.html', {'taken':closed},
+                          status=status.HTTP_409_CONFLICT)
+        questions = read_models.questions(Question.objects.filter(tournament_id=tournament_id))
+        question_ids = [question.id for question in questions]
+        #the form field names are the question ids, their values the user answers;
+        #answers autosaved earlier count unless the form changes them
+        answers = autosave.load(tournament_id, request.user.id, question_ids)
+        answers.update(request.POST.items())
+        correct_count, incorrect = grade(questions, answers)
+        incorrect_match_question = [question for question, _ in incorrect]
+        user_incorrect_answer = [answer for _, answer in incorrect]
+        #complete the participation once, the score is saved with it or
+        #queued for a batched write. A repeated or concurrent submission finds
+        #it completed, is graded and keeps the first score
+        today = datetime.date.today()
+        fields = {'complete_date': today}
+        if not settings.SCORE_WRITE_BEHIND:
+            fields['score'] = correct_count
+        with transaction.atomic():
+            # nor while the tournament is being closed
+            completed = TournamentPlayer.objects.filter(
+                tournament_id=tournament_id, player_id=request.user.id,
+                complete_date__isnull=True).exclude(
+                    tournament__status__in=[CLOSED, ARCHIVED]).update(**fields)
+            counters.add(tournament_id, completions=completed)
+        if completed and settings.SCORE_WRITE_BEHIND:
+            score_queue.put(tournament_id, request.user.id, correct_count, today)
+        autosave.clear(tournament_id, request.user.id, question_ids)
+        if completed:
+            publish_score(tournament_id, request.user, correct_count)
         return render(request, 'results.html',
                       {'user_incorrect_answer':user_incorrect_answer,
                        'correct_count':correct_count,
                        'incorrect_match_question':incorrect_match_question})
+
+
+class QuizQuestions(APIView):
+    """
+    Questions of a tournament as compact JSON for mobile clients, without answers
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, tournament_id, format=None):
+        '''
+        return the tournament and its questions, choices as an array
+        '''
+        tournament = Tournament.objects.filter(id=tournament_id).values(
+            'id', 'name', 'category', 'difficulty', 'end_date', 'status').first()
+        if tournament is None:
+            raise Http404
+        if tournament.pop('status') == ARCHIVED:
+            return Response({'detail': 'the tournament is archived'}, status=status.HTTP_410_GONE)
+        questions = Question.objects.filter(tournament_id=tournament_id).order_by('id').values_list(
+            'id', 'question', 'choices1', 'choices2', 'choices3', 'choices4')
+        tournament['questions'] = [{'id': row[0], 'question': row[1], 'choices': row[2:]}
+                                   for row in questions]
+        return Response(tournament)
+
+
+class QuizAutosave(APIView):
+    """
+    Buffer answers of an unfinished quiz as they are chosen, without a database query
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, tournament_id, format=None):
+        '''
+        save the answers, the body is {"answers": {"<question id>": "<answer>"}}
+        '''
+        serializer = SubmissionSerializer(data={'tournament': tournament_id,
+                                                'answers': answers_of(request.data)})
+        serializer.is_valid(raise_exception=True)
+        answers = serializer.validated_data['answers']
+        if len(answers) > NUMBER_OF_QUESTIONS or not all(key.isdigit() for key in answers):
+            return Response({'answers': 'expected at most one answer per question id'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if any(len(answer) > MAX_ANSWER_LENGTH for answer in answers.values()):
+            return Response({'answers': f'expected answers of at most {MAX_ANSWER_LENGTH} '
+                                        'characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        # only a started, unfinished quiz has a buffer, and only for its own
+        # questions. The database is read only when the buffer is not open,
+        # e.g. after it expired
+        question_ids = autosave.started(tournament_id, request.user.id)
+        if question_ids is None:
+            complete_dates = list(TournamentPlayer.objects.filter(
+                tournament_id=tournament_id, player_id=request.user.id).values_list(
+                    'complete_date', flat=True))
+            if not complete_dates:
+                tournament_status = Tournament.objects.filter(id=tournament_id).values_list(
+                    'status', flat=True).first()
+                if tournament_status is None:
+                    raise Http404
+                if tournament_status == ARCHIVED:
+                    return Response({'detail': 'the tournament is archived'},
+                                    status=status.HTTP_410_GONE)
+                return Response({'detail': 'the tournament has not been started'},
+                                status=status.HTTP_409_CONFLICT)
+            if complete_dates[0] is not None:
+                return Response({'detail': 'already taken'}, status=status.HTTP_409_CONFLICT)
+            question_ids = set(Question.objects.filter(tournament_id=tournament_id).values_list(
+                'id', flat=True))
+            autosave.start(tournament_id, request.user.id, question_ids)
+        if not {int(key) for key in answers} <= question_ids:
+            return Response({'answers': 'expected question ids of the tournament'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        autosave.save(tournament_id, request.user.id, answers)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class QuizSubmissions(APIView):
+    """
+    Grade a batch of answer submissions, e.g. several tournaments completed
+    offline, in one request and one transaction
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        '''
+        grade every submission and return one result per submission
+        '''
+        serializer = SubmissionSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        return Response(self.grade_submissions(request.user, serializer.validated_data))
+
+    @staticmethod
+    def grade_submissions(player, submissions):
+        '''
+        Grade the submissions of a player and save their scores with a fixed
+        number of queries, whatever the number of submissions
+        '''
+        tournament_ids = {submission['tournament'] for submission in submissions}
+        results = []
+        with transaction.atomic():
+            statuses = dict(Tournament.objects.filter(id__in=tournament_ids).values_list(
+                'id', 'status'))
+            questions = {}
+            for question in Question.objects.filter(tournament_id__in=tournament_ids).only(
+                    'id', 'tournament_id', 'correct_answer'):
+                questions.setdefault(question.tournament_id, []).append(question)
+            players = {tour_play.tournament_id: tour_play for tour_play in
+                       TournamentPlayer.objects.select_for_update().filter(
+                           player=player, tournament_id__in=tournament_ids)}
+            created, updated = [], []
+            for submission in submissions:
+                tournament_id = submission['tournament']
+                tour_play = players.get(tournament_id)
+                if tournament_id not in statuses:
+                    results.append({'tournament': tournament_id, 'error': 'not found'})
+                    continue
+                if statuses[tournament_id] == ARCHIVED:
+                    # its questions and scores have moved to the archive tables
+                    results.append({'tournament': tournament_id, 'error': 'archived'})
+                    continue
+                if statuses[tournament_id] == CLOSED:
+                    # its leaderboard is final and may be published already
+                    results.append({'tournament': tournament_id, 'error': 'closed'})
+                    continue
+                if tour_play is not None and tour_play.complete_date is not None:
+                    results.append({'tournament': tournament_id, 'error': 'already taken'})
+                    continue
+                tournament_questions = questions.get(tournament_id, [])
+                correct_count, incorrect = grade(tournament_questions, submission['answers'])
+                if tour_play is None:
+                    tour_play = TournamentPlayer(tournament_id=tournament_id, player=player)
+                    players[tournament_id] = tour_play
+                    created.append(tour_play)
+                else:
+                    updated.append(tour_play)
+                tour_play.score = correct_count
+                tour_play.complete_date = datetime.date.today()
+                results.append({'tournament': tournament_id,
+                                'score': correct_count,
+                                'total': len(tournament_questions),
+                                'incorrect': {question.id: question.correct_answer
+                                              for question, _ in incorrect}})
+            TournamentPlayer.objects.bulk_create(created)
+            TournamentPlayer.objects.bulk_update(updated, ['score', 'complete_date'])
+            counters.add_each(
+                participants=Counter(tour_play.tournament_id for tour_play in created),
+                completions=Counter(tour_play.tournament_id for tour_play in created + updated))
+        for result in results:
+            if 'score' in result:
+                # the quiz is completed, its autosaved answers are of no use
+                tournament_questions = questions.get(result['tournament'], [])
+                autosave.clear(result['tournament'], player.id,
+                               [question.id for question in tournament_questions])
+                publish_score(result['tournament'], player, result['score'])
+        return results
+
+
+class QuizAnswers(APIView):
+    """
+    Grade the answers of a single tournament submitted as JSON
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, tournament_id, format=None):
+        '''
+        grade the answers, the body is {"answers": {"<question id>": "<answer>"}}
+        '''
+        serializer = SubmissionSerializer(data={'tournament': tournament_id,
+                                                'answers': answers_of(request.data)})
+        serializer.is_valid(raise_exception=True)
+        result = QuizSubmissions.grade_submissions(request.user, [serializer.validated_data])[0]
+        if result.get('error') == 'not found':
+            return Response(result, status=status.HTTP_404_NOT_FOUND)
+        if result.get('error') == 'archived':
+            return Response(result, status=status.HTTP_410_GONE)
+        if result.get('error') in ('already taken', 'closed'):
+            return Response(result, status=status.HTTP_409_CONFLICT)
+        return Response(result)
+
+
+class AdmissionStats(APIView):
+    """
+    Queue depth and shed counts of the admission controller, for monitoring
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        '''
+        stats of this process, empty when admission control is off
+        '''
+        controller = admission.active_controller
+        return Response(controller.stats() if controller else {})
+
+
+class ProfileToken(APIView):
+    """
+    Issue a token that enables the sampling profiler for requests to a url name
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        '''
+        token for ?url_name=<name>, or for any url without it
+        '''
+        url_name = request.query_params.get('url_name', profiling.ANY_URL)
+        return Response({'url_name': url_name,
+                         'token': profiling.make_token(url_name),
+                         'header': 'X-Profile-Token',
+                         'expires_in': profiling.TOKEN_MAX_AGE,
+                         'enabled': settings.PROFILING['ENABLED']})
+
+
+class Search(APIView):
+    """
+    Full-text search of tournament names and, for admins, of the question bank
+    """
+    authentication_classes = [SessionAuthentication, BasicAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request, format=None):
+        '''
+        ?q=<words>, each matched as a prefix, best matches first. ?category=
+        and ?difficulty= filter by the tournament, ?limit= caps each list
+        '''
+        params = request.query_params
+        text = params.get('q', '')
+        if not search.words(text):
+            return Response({'q': 'expected words to search for'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        category, difficulty = params.get('category'), params.get('difficulty')
+        if category and category not in dict(CATEGORY_CHOICE):
+            return Response({'category': f'expected one of {", ".join(dict(CATEGORY_CHOICE))}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if difficulty and difficulty not in dict(DIFFICULTY_CHOICE):
+            return Response({'difficulty': 'expected one of '
+                                           f'{", ".join(dict(DIFFICULTY_CHOICE))}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = params.get('limit', '')
+        limit = min(int(limit), SEARCH_MAX_LIMIT) if limit.isdigit() else SEARCH_LIMIT
+        result = {'q': text,
+                  'tournaments': search.search_tournaments(text, category, difficulty, limit)}
+        # the questions carry no answers, but players must not browse the quizzes
+        if request.user.is_staff:
+            result['questions'] = search.search_questions(text, category, difficulty, limit)
+        return Response(result)
@@ -0,0 +1,154 @@
+'''
+Write-behind queue for tournament scores.
+
+When SCORE_WRITE_BEHIND is on, the results view only marks the
+TournamentPlayer row complete and counts the completion, so the quiz cannot
+be submitted twice, and appends the graded score to a per-process journal
+file. A background flusher coalesces the journals of every process and
+applies them with batched bulk_update calls every SCORE_QUEUE_FLUSH_INTERVAL
+seconds; leaderboards show a queued score after that flush. Journals are
+fsynced on write and truncated only after the batch is committed, so entries
+left behind by a crashed worker are replayed by the next flush; replaying is
+harmless because it only sets score and complete_date again.
+'''
+import datetime
+import logging
+import os
+import threading
+import time
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from .models import TournamentPlayer
+
+try:
+    import fcntl
+except ImportError:  # Windows, write-behind is not available
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreQueue:
+    '''
+    Durable local queue of (tournament, player, score, complete date) entries
+    '''
+    def __init__(self, directory, batch_size=500, interval=1.0):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._journal = None
+        self._flusher = None
+
+    def _journal_file(self):
+        '''Journal of the current process, reopened after a fork'''
+        if self._pid != os.getpid():
+            if fcntl is None:
+                raise RuntimeError('write-behind scoring needs fcntl file locking')
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'scores-{os.getpid()}.log')
+            self._journal = open(path, 'a')
+            self._pid = os.getpid()
+            self._flusher = None
+        return self._journal
+
+    def put(self, tournament_id, player_id, score, complete_date):
+        '''Durably record a score, the database is updated by the flusher'''
+        line = f'{tournament_id} {player_id} {score} {complete_date.isoformat()}\n'
+        with self._lock:
+            journal = self._journal_file()
+            fcntl.flock(journal, fcntl.LOCK_EX)
+            try:
+                journal.write(line)
+                journal.flush()
+                os.fsync(journal.fileno())
+            finally:
+                fcntl.flock(journal, fcntl.LOCK_UN)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        '''Flusher thread loop'''
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:  # keep flushing, the journal still holds the entries
+                logger.exception('score queue flush failed')
+            finally:
+                close_old_connections()
+
+    def pending(self):
+        '''Paths of the journals, of any process, that hold entries'''
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # sorted, so flushers that wait for each other lock in the same order
+        paths = sorted(os.path.join(self.directory, name) for name in names
+                       if name.endswith('.log'))
+        return [path for path in paths if os.path.getsize(path) > 0]
+
+    def flush(self, wait=False):
+        '''
+        Apply every journaled score to the database and empty the journals.
+        Returns the number of TournamentPlayer rows updated. Journals another
+        process is flushing are skipped, unless wait is set: read paths wait
+        for that flush to commit, so their reads include every queued score.
+        '''
+        journals = []
+        entries = {}
+        flags = fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            for path in self.pending():
+                journal = open(path, 'r+')
+                try:
+                    fcntl.flock(journal, flags)
+                except BlockingIOError:  # another process is flushing it
+                    journal.close()
+                    continue
+                journals.append(journal)
+                for line in journal:
+                    fields = line.split()
+                    if not line.endswith('\n') or len(fields) != 4:  # torn write from a crash
+                        continue
+                    tournament_id, player_id, score = (int(field) for field in fields[:3])
+                    # later entries for the same player win
+                    entries[(tournament_id, player_id)] = (
+                        score, datetime.date.fromisoformat(fields[3]))
+            updated = self._apply(entries) if entries else 0
+            for journal in journals:
+                journal.truncate(0)
+            return updated
+        finally:
+            for journal in journals:
+                journal.close()
+
+    def _apply(self, entries):
+        '''Write the coalesced entries with batched bulk updates'''
+        keys = list(entries)
+        updated = 0
+        with transaction.atomic():
+            for start in range(0, len(keys), self.batch_size):
+                batch = keys[start:start + self.batch_size]
+                pairs = reduce(or_, (Q(tournament_id=tournament_id, player_id=player_id)
+                                     for tournament_id, player_id in batch))
+                rows = TournamentPlayer.objects.filter(pairs).only(
+                    'id', 'tournament_id', 'player_id')
+                changed = []
+                for row in rows:
+                    row.score, row.complete_date = entries[(row.tournament_id, row.player_id)]
+                    changed.append(row)
+                TournamentPlayer.objects.bulk_update(changed, ['score', 'complete_date'])
+                updated += len(changed)
+        return updated
+
+
+score_queue = ScoreQueue(settings.SCORE_QUEUE_DIR,
+                         batch_size=settings.SCORE_QUEUE_BATCH_SIZE,
+                         interval=settings.SCORE_QUEUE_FLUSH_INTERVAL)